@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+import-time benchmark of decodense
+
+`import decodense` is timed in a number of fresh interpreters (relative to importing the pyscf modules
+decodense depends on), and the slowest modules imported are listed. with --max, the script exits with
+a non-zero status if the median import time of decodense on top of pyscf exceeds the given limit.
+
+usage:
+    python benchmarks/imports.py [--repeat 10] [--max 0.1]
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import os
+import sys
+import argparse
+import subprocess
+import numpy as np
+from typing import Dict, List, Tuple, Optional
+
+# source tree
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# pyscf modules imported by decodense
+PYSCF = 'import pyscf.gto, pyscf.scf, pyscf.dft, pyscf.lo, pyscf.lib, pyscf.symm'
+# timing of an import statement in a fresh interpreter
+TIMER = 'import time; t = time.perf_counter(); {:}; print(time.perf_counter() - t)'
+
+
+def _python(args: List[str]) -> subprocess.CompletedProcess:
+        """
+        this function runs a fresh interpreter with decodense from the source tree
+        """
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join([ROOT] + [os.environ.get('PYTHONPATH', '')])}
+        return subprocess.run([sys.executable] + args, env=env, stdout=subprocess.PIPE, \
+                              stderr=subprocess.PIPE, check=True)
+
+
+def import_time(repeat: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        this function returns the wall times (in s) of importing pyscf and of importing decodense on top of it
+        """
+        t_pyscf, t_decodense = np.empty(repeat), np.empty(repeat)
+        for i in range(repeat):
+            out = _python(['-c', '; '.join([TIMER.format(PYSCF), TIMER.format('import decodense')])])
+            t_pyscf[i], t_decodense[i] = map(float, out.stdout.decode().split())
+        return t_pyscf, t_decodense
+
+
+def slowest(n: int) -> List[Tuple[str, float]]:
+        """
+        this function returns the n slowest modules (cumulative import times in s) imported by decodense only
+        """
+        times_pyscf = _importtime(PYSCF)
+        times = {name: t for name, t in _importtime(PYSCF + '; import decodense').items() if name not in times_pyscf}
+        return sorted(times.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+def _importtime(code: str) -> Dict[str, float]:
+        """
+        this function returns the cumulative import times (in s) of all modules imported by a statement
+        """
+        out = _python(['-X', 'importtime', '-c', code])
+        times: Dict[str, float] = {}
+        for line in out.stderr.decode().splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative) * 1.e-6
+        return times
+
+
+def main(args: Optional[List[str]] = None) -> int:
+        """
+        this function runs the benchmark
+        """
+        parser = argparse.ArgumentParser(description = 'import-time benchmark of decodense')
+        parser.add_argument('--repeat', type = int, default = 10)
+        parser.add_argument('--max', type = float, default = None, help = 'limit (in s) on the median import time')
+        parser.add_argument('--top', type = int, default = 10)
+        args = parser.parse_args(args)
+
+        # import times
+        t_pyscf, t_decodense = import_time(args.repeat)
+        print('\n import pyscf:     median = {:.3f} s, min = {:.3f} s'.format(np.median(t_pyscf), np.min(t_pyscf)))
+        print(' import decodense: median = {:.3f} s, min = {:.3f} s (on top of pyscf)'.format(np.median(t_decodense), \
+                                                                                              np.min(t_decodense)))
+
+        # slowest modules
+        print('\n slowest modules imported by decodense (cumulative):')
+        for name, t in slowest(args.top):
+            print(' {:<40s}{:>8.3f} s'.format(name, t))
+
+        # regression guard
+        if args.max is not None and args.max < np.median(t_decodense):
+            print('\n median import time exceeds limit of {:.3f} s'.format(args.max))
+            return 1
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
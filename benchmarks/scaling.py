@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+scaling benchmarks of decodense.main()
+
+series of linear alkanes, water clusters, and all-trans polyenes of growing size are decomposed across
+functionals, partitionings, population schemes, localizations, and parallel modes. every decomposition
+is run in a fresh process, and wall time as well as peak memory are recorded together with scaling
+exponents fitted wrt the number of basis functions. mean-field results are cached on disk, such that
+only the decomposition itself is timed.
+
+usage:
+    python benchmarks/scaling.py [--series alkane water] [--sizes 2 4 8] [--quick] [--output bench.json]
+    python benchmarks/scaling.py --compare bench_old.json bench_new.json
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import platform
+import multiprocessing as mp
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple, List, Optional, Any
+
+# decodense from the source tree (also in worker processes)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# directory of cached mean-field results
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.scf_cache')
+# mean-field methods (functional and nlc functional) - hf, gga, meta-gga, range-separated hybrid, vv10
+METHODS: Dict[str, Tuple[str, str]] = {'hf': ('hf', ''), 'gga': ('pbe', ''), 'mgga': ('tpss', ''), \
+                                       'rsh': ('camb3lyp', ''), 'vv10': ('wb97m_v', 'vv10')}
+# smallest memory increase (in MB) for which memory scaling exponents are fitted
+MIN_DELTA_MEM = 1.
+# default settings
+SERIES = ('alkane', 'water', 'polyene')
+SIZES = (1, 2, 4, 6)
+PART = ('atoms', 'eda', 'orbitals')
+POP = ('mulliken',)
+LOC = ('',)
+PARALLEL = ('',)
+
+
+def alkane(n: int) -> str:
+        """
+        this function returns the geometry (in angstrom) of the linear alkane with n carbon atoms (all-staggered)
+        """
+        # carbon zigzag chain in the xy-plane
+        r_cc, r_ch, angle = 1.54, 1.09, np.radians(109.47)
+        dx, dy = r_cc * np.sin(angle / 2.), r_cc * np.cos(angle / 2.) / 2.
+        carbons = [np.array([i * dx, dy if i % 2 else -dy, 0.]) for i in range(n + 2)]
+        atoms = [('C', carbons[i + 1]) for i in range(n)]
+        # two hydrogens per carbon above and below the plane, opposite to the neighbouring carbons
+        for i in range(1, n + 1):
+            bisector = -_unit(carbons[i - 1] - carbons[i] + carbons[i + 1] - carbons[i])
+            for sign in (1., -1.):
+                atoms.append(('H', carbons[i] + r_ch * (np.cos(angle / 2.) * bisector + \
+                                                        sign * np.sin(angle / 2.) * np.array([0., 0., 1.]))))
+        # terminal hydrogens in place of the missing carbons
+        for i, j in ((1, 0), (n, n + 1)):
+            atoms.append(('H', carbons[i] + r_ch * _unit(carbons[j] - carbons[i])))
+        return _xyz(atoms)
+
+
+def polyene(n: int) -> str:
+        """
+        this function returns the geometry (in angstrom) of the planar all-trans polyene with 2n carbon atoms
+        """
+        # carbon zigzag chain in the xy-plane with alternating double and single bonds
+        r_ch, angle = 1.08, np.radians(120.)
+        carbons = [np.array([0., 0., 0.])]
+        for i in range(2 * n + 1):
+            r_cc = 1.34 if i % 2 else 1.46
+            direction = np.array([np.sin(angle / 2.), (1. if i % 2 else -1.) * np.cos(angle / 2.), 0.])
+            carbons.append(carbons[-1] + r_cc * direction)
+        atoms = [('C', carbons[i + 1]) for i in range(2 * n)]
+        # one hydrogen per carbon in the plane, opposite to the neighbouring carbons
+        for i in range(1, 2 * n + 1):
+            bisector = -_unit(_unit(carbons[i - 1] - carbons[i]) + _unit(carbons[i + 1] - carbons[i]))
+            atoms.append(('H', carbons[i] + r_ch * bisector))
+        # terminal hydrogens in place of the missing carbons
+        for i, j in ((1, 0), (2 * n, 2 * n + 1)):
+            atoms.append(('H', carbons[i] + r_ch * _unit(carbons[j] - carbons[i])))
+        return _xyz(atoms)
+
+
+def water(n: int) -> str:
+        """
+        this function returns the geometry (in angstrom) of a cluster of n water molecules on a cubic lattice
+        """
+        # monomer
+        r_oh, angle = .9572, np.radians(104.52)
+        monomer = [('O', np.zeros(3)), \
+                   ('H', r_oh * np.array([np.sin(angle / 2.), np.cos(angle / 2.), 0.])), \
+                   ('H', r_oh * np.array([-np.sin(angle / 2.), np.cos(angle / 2.), 0.]))]
+        # lattice of monomers (alternating orientations)
+        side = int(np.ceil(n ** (1. / 3.) - 1.e-12))
+        atoms = []
+        for k, site in enumerate(itertools.islice(itertools.product(range(side), repeat=3), n)):
+            rot = _rot(np.pi * k / 2.)
+            atoms += [(symbol, 2.9 * np.asarray(site) + rot.dot(coord)) for symbol, coord in monomer]
+        return _xyz(atoms)
+
+
+GEOMETRIES = {'alkane': alkane, 'water': water, 'polyene': polyene}
+
+
+def _unit(vec: np.ndarray) -> np.ndarray:
+        """
+        this function returns a normalized vector
+        """
+        return vec / np.linalg.norm(vec)
+
+
+def _rot(theta: float) -> np.ndarray:
+        """
+        this function returns the rotation matrix around the z-axis
+        """
+        return np.array([[np.cos(theta), -np.sin(theta), 0.], [np.sin(theta), np.cos(theta), 0.], [0., 0., 1.]])
+
+
+def _xyz(atoms: List[Tuple[str, np.ndarray]]) -> str:
+        """
+        this function returns a pyscf geometry string
+        """
+        return '; '.join('{:} {:.8f} {:.8f} {:.8f}'.format(symbol, *coord) for symbol, coord in atoms)
+
+
+def mean_field(series: str, size: int, method: str, basis: str) -> Any:
+        """
+        this function returns a converged mean-field object, either loaded from or stored in the cache
+        """
+        from pyscf import gto, scf, dft, lib
+        # molecule
+        mol = gto.M(atom = GEOMETRIES[series](size), basis = basis, verbose = 0, output = None)
+        # mean-field object
+        xc, nlc = METHODS[method]
+        if xc == 'hf':
+            mf = scf.RHF(mol)
+        else:
+            mf = dft.RKS(mol)
+            mf.xc = xc
+            mf.nlc = nlc
+            if nlc != '':
+                mf.nlcgrids.atom_grid = (50, 194)
+                mf.nlcgrids.prune = dft.gen_grid.sg1_prune
+        mf.conv_tol = 1.e-10
+        # cache file
+        key = hashlib.sha1('{:}|{:}|{:}|{:}'.format(mol.atom, basis, xc, nlc).encode()).hexdigest()
+        chkfile = os.path.join(CACHE_DIR, '{:}_{:d}_{:}_{:}.chk'.format(series, size, method, key[:12]))
+        if os.path.isfile(chkfile):
+            # load converged results
+            for attr, val in lib.chkfile.load(chkfile, 'scf').items():
+                setattr(mf, attr, val)
+            mf.converged = True
+            if xc != 'hf':
+                mf.grids.build()
+                if nlc != '':
+                    mf.nlcgrids.build()
+        else:
+            # run and store
+            os.makedirs(CACHE_DIR, exist_ok = True)
+            mf.kernel()
+            assert mf.converged, 'mean-field calculation did not converge: {:} {:d} {:}'.format(series, size, method)
+            lib.chkfile.dump(chkfile, 'scf', {'e_tot': mf.e_tot, 'mo_energy': mf.mo_energy, \
+                                              'mo_coeff': mf.mo_coeff, 'mo_occ': mf.mo_occ})
+        return mf
+
+
+def run(config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        this function decomposes a single configuration and returns its timings (in s) and memory (in MB)
+        (to be run in a fresh process such that the peak memory is that of the given configuration)
+        """
+        import decodense
+        from decodense.timings import peak_memory
+        # converged mean-field results
+        mf = mean_field(config['series'], config['size'], config['method'], config['basis'])
+        # decomposition
+        decomp = decodense.DecompCls(part = config['part'], pop = config['pop'], loc = config['loc'], \
+                                     parallel = config['parallel'], n_workers = config['n_workers'])
+        mem = peak_memory()
+        wall = time.perf_counter()
+        decodense.main(mf.mol, decomp, mf)
+        wall = time.perf_counter() - wall
+        return {**config, 'natm': int(mf.mol.natm), 'nao': int(mf.mol.nao_nr()), 'wall': wall, \
+                'peak_mem': peak_memory(), 'delta_mem': peak_memory() - mem, \
+                'stages': {name: entry['wall'] for name, entry in decomp.timings.items()}}
+
+
+def exponents(runs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        this function returns scaling exponents of wall time and memory wrt the number of basis functions
+        (least-squares fits of log-log data of all series with at least two sizes. the memory exponent refers to
+        the memory allocated by the decomposition on top of the mean-field results, and it is None if negligible)
+        """
+        fits = []
+        key = lambda run: tuple(run[axis] for axis in ('series', 'method', 'part', 'pop', 'loc', 'parallel'))
+        for group, group_runs in itertools.groupby(sorted(runs, key=key), key=key):
+            group_runs = sorted(group_runs, key=lambda run: run['nao'])
+            if len(set(run['nao'] for run in group_runs)) < 2:
+                continue
+            log_nao = np.log([run['nao'] for run in group_runs])
+            delta_mem = np.array([run['delta_mem'] for run in group_runs])
+            fits.append({**dict(zip(('series', 'method', 'part', 'pop', 'loc', 'parallel'), group)), \
+                         'wall': float(np.polyfit(log_nao, np.log([run['wall'] for run in group_runs]), 1)[0]), \
+                         'delta_mem': float(np.polyfit(log_nao, np.log(delta_mem), 1)[0]) \
+                                      if np.all(MIN_DELTA_MEM < delta_mem) else None})
+        return fits
+
+
+def metadata() -> Dict[str, Any]:
+        """
+        this function returns information on the benchmarked versions and the host
+        """
+        import pyscf
+        import decodense
+        from decodense.tools import git_version
+        return {'decodense': decodense.decomp.__version__, 'git': git_version(), 'pyscf': pyscf.__version__, \
+                'numpy': np.__version__, 'python': platform.python_version(), 'host': platform.node(), \
+                'cpus': os.cpu_count(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def table(runs: List[Dict[str, Any]], fits: List[Dict[str, Any]]) -> str:
+        """
+        this function returns tables of all runs and fitted scaling exponents
+        """
+        string = '\n {:<8s}{:>5s}{:>6s}{:>7s}{:>10s}{:>10s}{:>6s}{:>9s}{:>11s}{:>12s}\n'.format('series', 'size', 'nao', \
+                                                                                              'method', 'part', 'pop', \
+                                                                                              'loc', 'parallel', \
+                                                                                              'wall (s)', 'peak (MB)')
+        for run in runs:
+            string += ' {:<8s}{:>5d}{:>6d}{:>7s}{:>10s}{:>10s}{:>6s}{:>9s}{:>11.3f}{:>12.1f}\n'.format(run['series'], \
+                                                                                                    run['size'], \
+                                                                                                    run['nao'], \
+                                                                                                    run['method'], \
+                                                                                                    run['part'], \
+                                                                                                    run['pop'], \
+                                                                                                    run['loc'] or '-', \
+                                                                                                    run['parallel'] or '-', \
+                                                                                                    run['wall'], \
+                                                                                                    run['peak_mem'])
+        if fits:
+            string += '\n scaling exponents (wrt nao):\n'
+            for fit in fits:
+                string += ' {:<8s}{:>7s}{:>10s}{:>10s}{:>6s}{:>9s}   wall: {:5.2f}   memory: {:>5s}\n'.format( \
+                          fit['series'], fit['method'], fit['part'], fit['pop'], fit['loc'] or '-', \
+                          fit['parallel'] or '-', fit['wall'], \
+                          '-' if fit['delta_mem'] is None else '{:.2f}'.format(fit['delta_mem']))
+        return string
+
+
+def compare(fname_a: str, fname_b: str) -> str:
+        """
+        this function returns a comparison of two benchmark files (ratios of the second wrt the first)
+        """
+        with open(fname_a, 'r') as f_a, open(fname_b, 'r') as f_b:
+            bench_a, bench_b = json.load(f_a), json.load(f_b)
+        key = lambda run: tuple(run[axis] for axis in ('series', 'size', 'method', 'part', 'pop', 'loc', 'parallel'))
+        runs_a = {key(run): run for run in bench_a['runs']}
+        string = '\n {:} ({:}) vs. {:} ({:})\n'.format(bench_b['metadata']['git'], fname_b, \
+                                                      bench_a['metadata']['git'], fname_a)
+        string += ' {:<44s}{:>12s}{:>12s}\n'.format('configuration', 'wall ratio', 'mem ratio')
+        ratios = []
+        for run_b in bench_b['runs']:
+            run_a = runs_a.get(key(run_b))
+            if run_a is None:
+                continue
+            ratios.append((run_b['wall'] / run_a['wall'], run_b['peak_mem'] / run_a['peak_mem']))
+            string += ' {:<44s}{:>12.3f}{:>12.3f}\n'.format('/'.join(str(axis) or '-' for axis in key(run_b)), *ratios[-1])
+        if ratios:
+            string += ' {:<44s}{:>12.3f}{:>12.3f}\n'.format('geometric mean', *np.exp(np.mean(np.log(ratios), axis=0)))
+        return string
+
+
+def main(args: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        this function runs the benchmarks
+        """
+        parser = argparse.ArgumentParser(description = 'scaling benchmarks of decodense.main()')
+        parser.add_argument('--series', nargs = '+', default = SERIES, choices = SERIES)
+        parser.add_argument('--sizes', nargs = '+', type = int, default = SIZES)
+        parser.add_argument('--methods', nargs = '+', default = tuple(METHODS), choices = tuple(METHODS))
+        parser.add_argument('--part', nargs = '+', default = PART, choices = PART)
+        parser.add_argument('--pop', nargs = '+', default = POP, choices = ('mulliken', 'iao'))
+        parser.add_argument('--loc', nargs = '+', default = LOC, choices = ('', 'fb', 'pm', 'ibo-2', 'ibo-4'))
+        parser.add_argument('--parallel', nargs = '+', default = PARALLEL, choices = ('', 'procs', 'threads'))
+        parser.add_argument('--n-workers', type = int, default = None)
+        parser.add_argument('--basis', default = 'pcseg1')
+        parser.add_argument('--quick', action = 'store_true', help = 'smallest sizes and hf/gga only')
+        parser.add_argument('--output', default = 'bench_{:}.json'.format(time.strftime('%Y%m%d_%H%M%S')))
+        parser.add_argument('--compare', nargs = 2, metavar = ('OLD', 'NEW'))
+        args = parser.parse_args(args)
+
+        # comparison of two benchmark files
+        if args.compare is not None:
+            print(compare(*args.compare))
+            return {}
+
+        # configurations
+        sizes = args.sizes[:2] if args.quick else args.sizes
+        methods = [method for method in args.methods if method in ('hf', 'gga')] if args.quick else args.methods
+        configs = [{'series': series, 'size': size, 'method': method, 'part': part, 'pop': pop, 'loc': loc, \
+                    'parallel': parallel, 'n_workers': args.n_workers, 'basis': args.basis} \
+                   for series, size, method, part, pop, loc, parallel \
+                   in itertools.product(args.series, sizes, methods, args.part, args.pop, args.loc, args.parallel)]
+
+        # mean-field calculations (cached)
+        for series, size, method in sorted(set((config['series'], config['size'], config['method']) for config in configs)):
+            mean_field(series, size, method, args.basis)
+
+        # decompositions (each in a fresh process)
+        runs = []
+        for config in configs:
+            with ProcessPoolExecutor(max_workers = 1, mp_context = mp.get_context('spawn')) as executor:
+                runs.append(executor.submit(run, config).result())
+            print(' {:} done ({:.3f} s)'.format('/'.join(str(config[axis]) or '-' for axis in \
+                                                          ('series', 'size', 'method', 'part', 'pop', 'loc', 'parallel')), \
+                                               runs[-1]['wall']))
+
+        # scaling exponents
+        fits = exponents(runs)
+        bench = {'metadata': metadata(), 'runs': runs, 'fits': fits}
+        print(table(runs, fits))
+
+        # write results
+        with open(args.output, 'w') as f:
+            json.dump(bench, f, indent = 1)
+        print(' results written to {:}'.format(args.output))
+
+        return bench
+
+
+if __name__ == '__main__':
+    main()
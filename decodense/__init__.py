@@ -1,6 +1,11 @@
-from .decodense import main
+from .decodense import main, main_diff
+from .trajectory import trajectory
 from .decomp import DecompCls
+from .memory import plan as memory_plan
 from .orbitals import assign_rdm1s
+from .integrals import cache_info, cache_clear, cache_max_memory
 from .tools import mf_info, make_natorb, write_rdm1, res_add, res_sub
+from .export import ResultsWriter, write_results, read_results, read_chunks
+from .container import ResultsArray
 from .results import info, results
 from .data import *
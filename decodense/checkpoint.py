@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+checkpoint module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import hashlib
+import h5py
+import numpy as np
+from pyscf import gto
+from typing import Dict, Tuple, Union, Callable, Any
+
+from .integrals import mol_key
+
+
+def stage(chkfile: str, name: str, inputs: Tuple[Any, ...], \
+          compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        this function returns the products of a stage, either from a checkpoint file (if the hash of the stage
+        inputs matches the stored entry) or by computing (and checkpointing) them
+        """
+        if chkfile == '':
+            return compute()
+        key = inputs_hash(inputs)
+        res = load(chkfile, name, key)
+        if res is None:
+            res = compute()
+            dump(chkfile, name, key, res)
+        return res
+
+
+def inputs_hash(inputs: Any) -> str:
+        """
+        this function returns a hash of (nested tuples/lists of) arrays, mol objects, and simple values
+        """
+        key = hashlib.sha1()
+        _update(key, inputs)
+        return key.hexdigest()
+
+
+def load(chkfile: str, name: str, key: str) -> Union[None, Dict[str, Any]]:
+        """
+        this function loads the products of a stage from a checkpoint file (None if absent or outdated)
+        """
+        try:
+            with h5py.File(chkfile, 'r') as f:
+                if name not in f or f[name].attrs.get('inputs') != key:
+                    return None
+                return {k: _read(v) for k, v in f[name].items()}
+        except OSError:
+            return None
+
+
+def dump(chkfile: str, name: str, key: str, res: Dict[str, Any]) -> None:
+        """
+        this function stores the products of a stage in a checkpoint file
+        """
+        with h5py.File(chkfile, 'a') as f:
+            if name in f:
+                del f[name]
+            group = f.create_group(name)
+            for k, v in res.items():
+                _write(group, k, v)
+            # the inputs hash is written last such that an interrupted dump is never matched
+            group.attrs['inputs'] = key
+
+
+def _update(key: Any, val: Any) -> None:
+        """
+        this function updates a hash with a given value
+        """
+        if isinstance(val, gto.Mole):
+            key.update(b'mol' + bytes(mol_key(val), 'utf-8'))
+        elif isinstance(val, np.ndarray):
+            key.update(bytes(str((val.shape, val.dtype.str)), 'utf-8'))
+            key.update(np.ascontiguousarray(val).tobytes())
+        elif isinstance(val, (tuple, list)):
+            key.update(bytes('seq{:d}'.format(len(val)), 'utf-8'))
+            for v in val:
+                _update(key, v)
+        else:
+            key.update(bytes(repr(val), 'utf-8'))
+
+
+def _write(group: h5py.Group, key: str, val: Any) -> None:
+        """
+        this function writes an array, a tuple/list of arrays, or None to a hdf5 group
+        """
+        if isinstance(val, (tuple, list)):
+            sub = group.create_group(key)
+            sub.attrs['type'] = 'seq'
+            for i, v in enumerate(val):
+                _write(sub, str(i), v)
+        elif val is None:
+            group.create_group(key).attrs['type'] = 'none'
+        else:
+            group.create_dataset(key, data=np.asarray(val))
+
+
+def _read(obj: Union[h5py.Group, h5py.Dataset]) -> Any:
+        """
+        this function reads an array, a tuple of arrays, or None from a hdf5 group
+        """
+        if isinstance(obj, h5py.Dataset):
+            return obj[()]
+        if obj.attrs['type'] == 'none':
+            return None
+        return tuple(_read(obj[str(i)]) for i in range(len(obj)))
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+container module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import io
+import numpy as np
+from typing import Dict, List, Tuple, Iterator, Union, Optional, TextIO, Any
+
+from .decomp import COMP_KEYS
+from .export import tables
+from .data import AU_TO_KCAL_MOL, AU_TO_EV, AU_TO_KJ_MOL, AU_TO_DEBYE
+
+# partitions (tables) of a results array
+PARTITIONS = ('atoms', 'orbitals')
+# index columns of the partitions
+INDEX_KEYS = ('atom', 'spin', 'mo')
+# conversion factors from atomic units
+UNITS = {'energy': {'au': 1., 'kcal_mol': AU_TO_KCAL_MOL, 'ev': AU_TO_EV, 'kj_mol': AU_TO_KJ_MOL}, \
+         'dipole': {'au': 1., 'debye': AU_TO_DEBYE}}
+# number of rows rendered at once
+CHUNK_ROWS = 4096
+
+
+class ResultsArray(object):
+        """
+        this class holds the results of a decomposition as one structured array per partition (atoms (or fragments)
+        and/or orbitals) with component columns (e.g., `el` or `energy/el` for multiple properties, vector columns of
+        shape (3,)) and index columns (`atom`, or `spin` and `mo`). item access mirrors the dict returned by main()
+        """
+        def __init__(self, atoms: Optional[np.ndarray] = None, orbitals: Optional[np.ndarray] = None, \
+                     info: Optional[Dict[str, Any]] = None, units: Optional[Dict[str, str]] = None) -> None:
+            """
+            init ResultsArray
+            """
+            self.atoms = atoms
+            self.orbitals = orbitals
+            self.info = {} if info is None else info
+            self.units = {'energy': 'au', 'dipole': 'au'} if units is None else units
+
+        @classmethod
+        def from_dict(cls, res: Dict[str, Any]) -> 'ResultsArray':
+            """
+            this function returns the results array of a result dictionary (as returned by main())
+            """
+            res_tables = tables(res)
+            arrays: Dict[str, Optional[np.ndarray]] = {}
+            for partition in PARTITIONS:
+                columns = res_tables[partition]
+                columns.pop('record', None)
+                if not columns:
+                    arrays[partition] = None
+                    continue
+                n_rows = next(iter(columns.values())).shape[0]
+                if partition == 'atoms':
+                    columns = {'atom': np.arange(n_rows, dtype=np.int64), **columns}
+                dtype = [(key, val.dtype, val.shape[1:]) for key, val in columns.items()]
+                arrays[partition] = np.empty(n_rows, dtype=dtype)
+                for key, val in columns.items():
+                    arrays[partition][key] = val
+            info = {key: val[0].item() for key, val in res_tables['records'].items() \
+                    if key not in ['record', 'n_atoms', 'n_orbitals']}
+            return cls(arrays['atoms'], arrays['orbitals'], info)
+
+        def to_dict(self, item: Optional[str] = None) -> Dict[str, Any]:
+            """
+            this function returns the result dictionary (as returned by main()) of the results array
+            (or only a given item of it)
+            """
+            res: Dict[str, Any] = {}
+            if self.atoms is not None:
+                for key in self.atoms.dtype.names:
+                    if key not in INDEX_KEYS and _item(key, item):
+                        _nested(res, key, self.atoms[key])
+            if self.orbitals is not None:
+                # spins are stored contiguously (alpha before beta)
+                n_alpha = int(np.count_nonzero(self.orbitals['spin'] == 0))
+                spins = (slice(0, n_alpha), slice(n_alpha, self.orbitals.size))
+                for key in self.orbitals.dtype.names:
+                    if key in INDEX_KEYS or not any(_item(prop + key, item) for prop in self._props()):
+                        continue
+                    val = [self.orbitals[key][spin] for spin in spins]
+                    if key == 'mo_occ':
+                        val = tuple(val)
+                    elif key == 'orbsym':
+                        val = np.array(val) if val[0].size == val[1].size else val
+                    # orbital-independent quantities are shared by all properties
+                    if key in ['mo_occ', 'orbsym']:
+                        for prop in self._props():
+                            if _item(prop + key, item):
+                                _nested(res, prop + key, val)
+                    elif _item(key, item):
+                        _nested(res, key, val)
+            for key, val in self.info.items():
+                if _item(key, item):
+                    _nested(res, key, val)
+            return res
+
+        def __getitem__(self, key: str) -> Any:
+            """
+            this function returns an item of the result dictionary (only the item itself is built)
+            """
+            if key not in self:
+                raise KeyError(key)
+            return self.to_dict(key)[key]
+
+        def __contains__(self, key: str) -> bool:
+            """
+            this function returns whether the result dictionary contains an item
+            """
+            return key in self.keys()
+
+        def keys(self) -> List[str]:
+            """
+            this function returns the keys of the result dictionary (from the column names)
+            """
+            keys: List[str] = []
+            for array in (self.atoms, self.orbitals):
+                if array is None:
+                    continue
+                for key in array.dtype.names:
+                    if key in ['mo_occ', 'orbsym']:
+                        keys += [(prop + key).partition('/')[0] for prop in self._props()]
+                    elif key not in INDEX_KEYS:
+                        keys.append(key.partition('/')[0])
+            keys += [key.partition('/')[0] for key in self.info]
+            return list(dict.fromkeys(keys))
+
+        def columns(self, partition: str) -> List[str]:
+            """
+            this function returns the component columns of a partition
+            """
+            array = getattr(self, partition)
+            if array is None:
+                return []
+            return [key for key in array.dtype.names if _kind(key, array.dtype[key]) is not None]
+
+        def to_unit(self, energy: Optional[str] = None, dipole: Optional[str] = None) -> 'ResultsArray':
+            """
+            this function returns a copy of the results array with energy and/or dipole contributions in other units
+            (`au`, `kcal_mol`, `ev`, or `kj_mol` for energies and `au` or `debye` for dipole moments)
+            """
+            units = {'energy': self.units['energy'] if energy is None else energy.lower(), \
+                     'dipole': self.units['dipole'] if dipole is None else dipole.lower()}
+            for kind, unit in units.items():
+                assert unit in UNITS[kind], \
+                    'illegal unit for {:}. valid options are: {:}'.format(kind, ', '.join(UNITS[kind]))
+            res = self.copy()
+            res.units = units
+            for partition in PARTITIONS:
+                array = getattr(res, partition)
+                if array is None:
+                    continue
+                for key in res.columns(partition):
+                    kind = _kind(key, array.dtype[key])
+                    array[key] *= UNITS[kind][units[kind]] / UNITS[kind][self.units[kind]]
+            return res
+
+        def sum(self, partition: Optional[str] = None) -> Dict[str, Union[float, np.ndarray]]:
+            """
+            this function returns the sums of all component columns (of all or a given partition)
+            """
+            sums: Dict[str, Union[float, np.ndarray]] = {}
+            for part in (PARTITIONS if partition is None else (partition,)):
+                array = getattr(self, part)
+                for key in self.columns(part):
+                    sums[key] = sums.get(key, 0.) + np.sum(array[key], axis=0)
+            return sums
+
+        def total(self, prop: str = '') -> Union[float, np.ndarray]:
+            """
+            this function returns the total (electronic plus structural) property
+            """
+            prefix = prop + '/' if prop != '' else ''
+            sums = self.sum()
+            return sums[prefix + 'el'] + sums.get(prefix + 'struct', 0.)
+
+        def top(self, k: int, key: str = 'el', partition: Optional[str] = None) -> np.ndarray:
+            """
+            this function returns the k rows of a partition with the largest contributions of a given column
+            (in absolute value or norm), in descending order
+            """
+            if partition is None:
+                partition = next(part for part in ('orbitals', 'atoms') if key in self.columns(part))
+            array = getattr(self, partition)
+            val = array[key]
+            val = np.abs(val) if val.ndim == 1 else np.linalg.norm(val, axis=1)
+            k = min(k, array.size)
+            idx = np.argpartition(-val, k - 1)[:k] if 0 < k < array.size else np.arange(array.size)
+            return array[idx[np.argsort(-val[idx], kind='stable')]]
+
+        def copy(self) -> 'ResultsArray':
+            """
+            this function returns a copy of the results array
+            """
+            return ResultsArray(None if self.atoms is None else self.atoms.copy(), \
+                                None if self.orbitals is None else self.orbitals.copy(), \
+                                dict(self.info), dict(self.units))
+
+        def _binary(self, other: 'ResultsArray', sign: float) -> 'ResultsArray':
+            """
+            this function returns the sum or difference of the component columns of two results arrays
+            """
+            assert self.units == other.units, 'results arrays must have the same units'
+            res = self.copy()
+            for partition in PARTITIONS:
+                array, array_other = getattr(res, partition), getattr(other, partition)
+                assert (array is None) == (array_other is None) and \
+                       (array is None or (array.dtype == array_other.dtype and array.size == array_other.size)), \
+                    'results arrays must have the same {:} columns and rows'.format(partition)
+                if array is None:
+                    continue
+                for key in res.columns(partition):
+                    array[key] += sign * array_other[key]
+            return res
+
+        def __add__(self, other: 'ResultsArray') -> 'ResultsArray':
+            """
+            this function adds two results arrays (cf. tools.res_add())
+            """
+            return self._binary(other, 1.)
+
+        def __sub__(self, other: 'ResultsArray') -> 'ResultsArray':
+            """
+            this function subtracts two results arrays (cf. tools.res_sub())
+            """
+            return self._binary(other, -1.)
+
+        def render(self, partition: Optional[str] = None, stream: Optional[TextIO] = None, \
+                   chunk_rows: int = CHUNK_ROWS) -> Optional[str]:
+            """
+            this function renders a partition (default: orbitals if present) as a table, which is written to a stream
+            chunk by chunk (or returned as a string if no stream is given)
+            """
+            if partition is None:
+                partition = 'orbitals' if self.orbitals is not None else 'atoms'
+            array = getattr(self, partition)
+            assert array is not None, 'no {:} partition in results array'.format(partition)
+            out = io.StringIO() if stream is None else stream
+            for chunk in _render(array, self.units, chunk_rows):
+                out.write(chunk)
+            return out.getvalue() if stream is None else None
+
+        def _props(self) -> List[str]:
+            """
+            this function returns the property prefixes of the columns
+            """
+            names = [name for array in (self.atoms, self.orbitals) if array is not None for name in array.dtype.names]
+            props = sorted({name.rpartition('/')[0] for name in names if '/' in name})
+            return [prop + '/' for prop in props] if props else ['']
+
+        def __repr__(self) -> str:
+            """
+            this function returns a short description of the results array
+            """
+            return 'ResultsArray(atoms={:}, orbitals={:}, units={:})'.format( \
+                None if self.atoms is None else self.atoms.size, \
+                None if self.orbitals is None else self.orbitals.size, self.units)
+
+
+def _kind(key: str, dtype: np.dtype) -> Optional[str]:
+        """
+        this function returns the kind (`energy` or `dipole`) of a component column (None for other columns)
+        """
+        prop, _, comp_key = key.rpartition('/')
+        if comp_key not in COMP_KEYS:
+            return None
+        if prop in UNITS:
+            return prop
+        return 'dipole' if dtype.shape == (3,) else 'energy'
+
+
+def _item(key: str, item: Optional[str]) -> bool:
+        """
+        this function returns whether a column belongs to a given item of the result dictionary (all for None)
+        """
+        return item is None or key.partition('/')[0] == item
+
+
+def _nested(res: Dict[str, Any], key: str, val: Any) -> None:
+        """
+        this function sets an item of a (possibly nested) result dictionary
+        """
+        prop, _, key = key.rpartition('/')
+        if prop != '':
+            res = res.setdefault(prop, {})
+        res[key] = val
+
+
+def _render(array: np.ndarray, units: Dict[str, str], chunk_rows: int) -> Iterator[str]:
+        """
+        this function yields the header and the rows of a table of a structured array in chunks
+        """
+        # columns (vector columns are split into components), their widths, and their formats
+        columns: List[Tuple[str, int, str, str, Optional[int]]] = []
+        for key in array.dtype.names:
+            dtype = array.dtype[key]
+            if dtype.shape == (3,):
+                columns += [(key + axis, 14, '.6f', key, ax_idx) for ax_idx, axis in enumerate(('-x', '-y', '-z'))]
+            elif dtype.kind in 'iu':
+                columns.append((key, 6, 'd', key, None))
+            elif dtype.kind in 'US':
+                columns.append((key, 10, 's', key, None))
+            else:
+                columns.append((key, 14, '.6e' if key == 'mo_occ' else '.6f', key, None))
+        # column widths fit the column names
+        widths = [max(width, len(name)) for name, width, _, _, _ in columns]
+        # header
+        header = ' '.join('{:>{:d}s}'.format(name, width) for (name, _, _, _, _), width in zip(columns, widths))
+        yield '# units: {:}\n'.format(', '.join('{:}: {:}'.format(kind, unit) for kind, unit in units.items())) + \
+              header + '\n' + '-' * len(header) + '\n'
+        # rows (one format per row applied to chunks of column lists)
+        row_fmt = ' '.join('%{:d}{:}'.format(width, spec) for (_, _, spec, _, _), width in zip(columns, widths)) + '\n'
+        for start in range(0, array.size, chunk_rows):
+            chunk = array[start:start + chunk_rows]
+            cols = [(chunk[key] if ax_idx is None else chunk[key][:, ax_idx]).tolist() for _, _, _, key, ax_idx in columns]
+            yield ''.join(row_fmt % row for row in zip(*cols))
@@ -14,52 +14,247 @@ import numpy as np
 from pyscf import gto, scf, dft
 from typing import Dict, Tuple, List, Union, Optional, Any
 
-from .decomp import DecompCls, sanity_check
-from .orbitals import loc_orbs, assign_rdm1s
-from .properties import prop_tot
-from .tools import make_natorb, mf_info, write_rdm1
+from .checkpoint import stage
+from .decomp import COMP_KEYS, DecompCls, sanity_check
+from .memory import plan as memory_plan, info as memory_info
+from .orbitals import IAOContext, loc_orbs, assign_rdm1s, project_orbs, screen_weights
+from .parallel import info as parallel_info
+from .properties import prop_tot, xc_tot, make_rdm1_eff
+from .timings import Timings, timing
+from .tools import make_natorb, mf_info, write_rdm1, e_tot
 
 
 def main(mol: gto.Mole, decomp: DecompCls, \
          mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], \
          rdm1_orb: np.ndarray = None, \
          rdm1_eff: np.ndarray = None, \
-         loc_lst: Optional[Any] = None) -> Dict[str, Any]:
+         loc_lst: Optional[Any] = None, \
+         loc_guess: Optional[Tuple[gto.Mole, Tuple[np.ndarray, np.ndarray]]] = None) -> Dict[str, Any]:
         """
         main decodense program
+        (loc_guess: mol object and localized orbitals of another geometry used to warm-start the localization)
         """
-        # sanity check
-        sanity_check(mol, decomp)
+        with Timings() as timings, timing('total'):
 
-        # format orbitals from mean-field calculation
-        if rdm1_orb is None:
-            mo_coeff, mo_occ = mf_info(mf)
-        else:
-            mo_coeff, mo_occ = make_natorb(mol, np.asarray(mf.mo_coeff), np.asarray(rdm1_orb))
+            # sanity check
+            with timing('sanity_check'):
+                sanity_check(mol, decomp)
 
-        # compute localized molecular orbitals
-        if decomp.loc != '':
-            mo_coeff = loc_orbs(mol, mo_coeff, mo_occ, decomp.loc, decomp.ndo, loc_lst)
+            # memory plan (grid block size and number of workers)
+            with timing('memory_plan'):
+                decomp.plan = memory_plan(mol, mf, decomp)
+            if 0 < decomp.verbose:
+                print(memory_info(decomp.plan))
+
+            # parallel settings
+            if 0 < decomp.verbose and decomp.parallel != '':
+                print(parallel_info(decomp.parallel, decomp.plan['n_workers']))
+
+            # orbitals and population weights
+            mo_coeff, mo_occ, weights = _state(mol, decomp, mf, rdm1_orb, loc_lst, loc_guess)
+            decomp.mo_coeff = mo_coeff
 
-        # decompose property
-        if decomp.part in ['atoms', 'eda']:
-            # compute population weights
-            weights = assign_rdm1s(mol, mo_coeff, mo_occ, decomp.pop, decomp.part, \
-                                   decomp.ndo, decomp.multiproc, decomp.verbose)
-            # compute decomposed results
-            decomp.res = prop_tot(mol, mf, mo_coeff, mo_occ, rdm1_eff, \
-                                  decomp.pop, decomp.prop, decomp.part, \
-                                  decomp.ndo, decomp.multiproc, decomp.gauge_origin, \
-                                  weights = weights)
-        else: # orbs
             # compute decomposed results
             decomp.res = prop_tot(mol, mf, mo_coeff, mo_occ, rdm1_eff, \
                                   decomp.pop, decomp.prop, decomp.part, \
-                                  decomp.ndo, decomp.multiproc, decomp.gauge_origin)
+                                  decomp.ndo, decomp.parallel, decomp.gauge_origin, \
+                                  grid_blksize = decomp.plan['grid_blksize'], n_workers = decomp.plan['n_workers'], \
+                                  chkfile = decomp.chkfile, auxbasis = decomp.auxbasis, frags = decomp.frags, **weights)
+
+            # deviation of decomposed total energy from mean-field total energy
+            # (only defined for decompositions of the mean-field density itself)
+            prop_types = [decomp.prop] if isinstance(decomp.prop, str) else decomp.prop
+            decomp.e_tot_dev = None
+            if 'energy' in prop_types and rdm1_orb is None and rdm1_eff is None:
+                res = decomp.res if isinstance(decomp.prop, str) else decomp.res['energy']
+                decomp.e_tot_dev = e_tot(res) - mf.e_tot
+                if 0 < decomp.verbose:
+                    print(' deviation of decomposed total energy from mf.e_tot: {:.3e}'.format(decomp.e_tot_dev))
+
+            # write rdm1s
+            if decomp.write != '':
+                with timing('output'):
+                    write_rdm1(mol, decomp.part, mo_coeff, mo_occ, decomp.write, weights.get('weights'), frags = decomp.frags)
 
-        # write rdm1s
-        if decomp.write != '':
-            write_rdm1(mol, decomp.part, mo_coeff, mo_occ, decomp.write, weights)
+        # timings
+        decomp.timings = timings.stages
+        if 0 < decomp.verbose:
+            print(timings.table())
 
         return decomp.res
 
+
+def main_diff(mol: gto.Mole, decomp: DecompCls, \
+              mfs: List[Union[scf.hf.SCF, dft.rks.KohnShamDFT]], \
+              rdm1_orb: Optional[List[np.ndarray]] = None, \
+              rdm1_eff: Optional[List[np.ndarray]] = None, \
+              loc_lst: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """
+        this function returns the decomposed property differences between two or more states (mean-field objects)
+        of the same molecule and the first of these (e.g., excited-state minus ground-state results). state-independent
+        quantities are shared, and xc contributions of all states are evaluated in the same pass over the grid
+        """
+        with Timings() as timings, timing('total'):
+
+            # sanity check
+            with timing('sanity_check'):
+                sanity_check(mol, decomp)
+            assert 1 < len(mfs), 'at least two states must be supplied'
+
+            # memory plan (grid block size and number of workers)
+            with timing('memory_plan'):
+                decomp.plan = memory_plan(mol, mfs[0], decomp, n_states = len(mfs))
+            if 0 < decomp.verbose:
+                print(memory_info(decomp.plan))
+
+            # parallel settings
+            if 0 < decomp.verbose and decomp.parallel != '':
+                print(parallel_info(decomp.parallel, decomp.plan['n_workers']))
+
+            # optional 1-RDMs of individual states
+            if rdm1_orb is None:
+                rdm1_orb = [None] * len(mfs)
+            if rdm1_eff is None:
+                rdm1_eff = [None] * len(mfs)
+
+            # orbitals and population weights of all states
+            states = [_state(mol, decomp, mf, rdm1_orb[k], loc_lst, None, tag = _tag(k)) \
+                      for k, mf in enumerate(mfs)]
+
+            # xc contributions of all states from a single pass over a common grid
+            prop_types = [decomp.prop] if isinstance(decomp.prop, str) else decomp.prop
+            if 'energy' in prop_types and _common_grids(mfs):
+                xc = xc_tot(mol, mfs[0], [state[0] for state in states], [state[1] for state in states], \
+                            [make_rdm1_eff(state[0], state[1], rdm1_eff[k]) for k, state in enumerate(states)], \
+                            decomp.part, decomp.parallel, grid_blksize = decomp.plan['grid_blksize'], \
+                            n_workers = decomp.plan['n_workers'])
+                xc_kwargs = [{'xc': xc_state} for xc_state in xc]
+            else:
+                xc_kwargs = [{} for _ in mfs]
+
+            # compute decomposed results of all states
+            res = [prop_tot(mol, mf, mo_coeff, mo_occ, rdm1_eff[k], \
+                            decomp.pop, decomp.prop, decomp.part, \
+                            decomp.ndo, decomp.parallel, decomp.gauge_origin, \
+                            grid_blksize = decomp.plan['grid_blksize'], n_workers = decomp.plan['n_workers'], \
+                            chkfile = decomp.chkfile, auxbasis = decomp.auxbasis, frags = decomp.frags, \
+                            tag = _tag(k), **weights, **xc_kwargs[k]) \
+                   for k, (mf, (mo_coeff, mo_occ, weights)) in enumerate(zip(mfs, states))]
+
+            # differences wrt first state
+            decomp.res = [_res_diff(res_state, res[0]) for res_state in res[1:]]
+
+        # timings
+        decomp.timings = timings.stages
+        if 0 < decomp.verbose:
+            print(timings.table())
+
+        return decomp.res
+
+
+def _state(mol: gto.Mole, decomp: DecompCls, \
+           mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], \
+           rdm1_orb: np.ndarray, loc_lst: Optional[Any], \
+           loc_guess: Optional[Tuple[gto.Mole, Tuple[np.ndarray, np.ndarray]]], \
+           tag: str = '') -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray], Dict[str, Any]]:
+        """
+        this function returns the (localized) orbitals, occupations, and population weights (as prop_tot() kwargs) of a state
+        """
+        # IAO quantities shared between localization and populations
+        iao_ctx = IAOContext(mol) if 'ibo' in decomp.loc or decomp.pop == 'iao' else None
+
+        # format orbitals from mean-field calculation and compute localized molecular orbitals
+        orbs = stage(decomp.chkfile, 'orbs' + tag, (mol, np.asarray(mf.mo_coeff), np.asarray(mf.mo_occ), rdm1_orb, \
+                                                    decomp.loc, decomp.ndo, loc_lst), \
+                     lambda: _orbs(mol, decomp, mf, rdm1_orb, loc_lst, loc_guess, iao_ctx))
+        mo_coeff, mo_occ = orbs['mo_coeff'], orbs['mo_occ']
+
+        # compute population weights
+        if decomp.part in ['atoms', 'eda']:
+            with timing('weights'):
+                weights = stage(decomp.chkfile, 'weights' + tag, (mol, mo_coeff, mo_occ, decomp.pop, decomp.ndo, decomp.frags), \
+                                lambda: {'weights': assign_rdm1s(mol, mo_coeff, mo_occ, decomp.pop, decomp.part, \
+                                                                 decomp.ndo, decomp.parallel, decomp.verbose, \
+                                                                 n_workers = decomp.plan['n_workers'], iao_ctx = iao_ctx, \
+                                                                 frags = decomp.frags)})
+            # sparse population weights
+            if 0. < decomp.weight_thres:
+                weights_sparse, decomp.weight_discarded = screen_weights(weights['weights'], decomp.weight_thres, \
+                                                                         decomp.verbose)
+                weights = {'weights': weights_sparse}
+        else:
+            weights = {}
+
+        return mo_coeff, mo_occ, weights
+
+
+def _tag(k: int) -> str:
+        """
+        this function returns the suffix of the checkpoint stages of a given state (none for the first state)
+        """
+        return '' if k == 0 else '_{:d}'.format(k)
+
+
+def _common_grids(mfs: List[Union[scf.hf.SCF, dft.rks.KohnShamDFT]]) -> bool:
+        """
+        this function returns whether all states are ks-dft states sharing functional and grids
+        """
+        if not all(isinstance(mf, dft.rks.KohnShamDFT) for mf in mfs):
+            return False
+        for mf in mfs[1:]:
+            if mf.xc != mfs[0].xc or mf.nlc != mfs[0].nlc:
+                return False
+            if not (np.array_equal(mf.grids.coords, mfs[0].grids.coords) and \
+                    np.array_equal(mf.grids.weights, mfs[0].grids.weights)):
+                return False
+            if mf.nlc.upper() == 'VV10' and \
+               not (np.array_equal(mf.nlcgrids.coords, mfs[0].nlcgrids.coords) and \
+                    np.array_equal(mf.nlcgrids.weights, mfs[0].nlcgrids.weights)):
+                return False
+        return True
+
+
+def _res_diff(res_a: Dict[str, Any], res_b: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        this function returns the differences between the property contributions of two result dictionaries
+        """
+        diff: Dict[str, Any] = {}
+        for key, val in res_a.items():
+            if isinstance(val, dict):
+                diff[key] = _res_diff(val, res_b[key])
+            elif key in COMP_KEYS + ['charge_atom']:
+                if isinstance(val, list):
+                    diff[key] = [val_a - val_b for val_a, val_b in zip(val, res_b[key])]
+                else:
+                    diff[key] = val - res_b[key]
+        return diff
+
+
+def _orbs(mol: gto.Mole, decomp: DecompCls, \
+          mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], \
+          rdm1_orb: np.ndarray, loc_lst: Optional[Any], \
+          loc_guess: Optional[Tuple[gto.Mole, Tuple[np.ndarray, np.ndarray]]], \
+          iao_ctx: Optional[IAOContext] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        this function returns the (possibly localized) orbitals and their occupations
+        """
+        # format orbitals from mean-field calculation
+        with timing('orbitals'):
+            if rdm1_orb is None:
+                mo_coeff, mo_occ = mf_info(mf)
+            else:
+                mo_coeff, mo_occ = make_natorb(mol, np.asarray(mf.mo_coeff), np.asarray(rdm1_orb))
+
+        # compute localized molecular orbitals
+        if decomp.loc != '':
+            with timing('localization'):
+                if loc_guess is None:
+                    mo_guess = None
+                else:
+                    mo_guess = project_orbs(mol, mo_coeff, mo_occ, *loc_guess, loc_lst)
+                decomp.loc_stats = []
+                mo_coeff = loc_orbs(mol, mo_coeff, mo_occ, decomp.loc, decomp.ndo, loc_lst, mo_guess, \
+                                    decomp.parallel, decomp.plan['n_workers'], decomp.verbose, decomp.loc_stats, iao_ctx)
+
+        return {'mo_coeff': mo_coeff, 'mo_occ': mo_occ}
+
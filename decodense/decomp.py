@@ -14,7 +14,7 @@ __status__ = 'Development'
 
 import numpy as np
 from pyscf import gto
-from typing import List, Dict, Union, Any
+from typing import List, Tuple, Dict, Union, Any
 
 
 # component keys
@@ -25,24 +25,48 @@ class DecompCls(object):
         this class contains all decomp attributes
         """
         def __init__(self, loc: str = '', pop: str = 'mulliken', \
-                     part = 'atoms', ndo: bool = False, multiproc: bool = False, \
+                     part: Union[str, List[List[int]], Tuple[str, List[List[int]]]] = 'atoms', \
+                     ndo: bool = False, multiproc: bool = False, \
                      gauge_origin: Union[List[Any], np.ndarray] = np.zeros(3), \
-                     prop: str = 'energy', write: str = '', verbose: int = 0) -> None:
+                     prop: Union[str, List[str]] = 'energy', write: str = '', verbose: int = 0, \
+                     grid_blksize: Union[None, int] = None, parallel: str = '', \
+                     n_workers: Union[None, int] = None, chkfile: str = '', \
+                     auxbasis: Union[None, str] = None, weight_thres: float = 0., \
+                     max_memory: Union[None, float] = None) -> None:
                 """
                 init molecule attributes
                 """
                 # set system defaults
                 self.loc = loc
                 self.pop = pop
-                self.part = part
+                # fragment partitioning (lists of atom indices, optionally preceded by the `atoms` or `eda` scheme)
+                if isinstance(part, str):
+                    self.part, self.frags = part, None
+                elif isinstance(part, tuple) and len(part) == 2 and isinstance(part[0], str):
+                    self.part, self.frags = part
+                else:
+                    self.part, self.frags = 'atoms', part
                 self.ndo = ndo
                 self.multiproc = multiproc
                 self.gauge_origin = gauge_origin
                 self.prop = prop
                 self.write = write
                 self.verbose = verbose
+                self.grid_blksize = grid_blksize
+                self.parallel = 'procs' if multiproc and parallel == '' else parallel
+                self.n_workers = n_workers
+                self.chkfile = chkfile
+                self.auxbasis = auxbasis
+                self.weight_thres = weight_thres
+                self.max_memory = max_memory
                 # set internal defaults
                 self.res: Dict[str, np.ndarray] = {comp_key: None for comp_key in COMP_KEYS}
+                self.mo_coeff: Tuple[np.ndarray, np.ndarray] = None
+                self.e_tot_dev: float = None
+                self.loc_stats: List[Dict[str, Any]] = None
+                self.weight_discarded: float = None
+                self.timings: Dict[str, Dict[str, Union[int, float]]] = None
+                self.plan: Dict[str, Any] = None
                 self.charge_atom: np.ndarray = None
                 self.dist: np.ndarray = None
                 self.weights: np.ndarray = None
@@ -62,23 +86,53 @@ def sanity_check(mol: gto.Mole, decomp: DecompCls) -> None:
         # partitioning
         assert decomp.part in ['atoms', 'eda', 'orbitals'], \
             'invalid partitioning. valid choices: `atoms` (default), `eda`, or `orbitals`'
+        # fragments
+        if decomp.frags is not None:
+            assert decomp.part in ['atoms', 'eda'], \
+                'invalid fragment partitioning. valid choices: `atoms` (default) or `eda` scheme'
+            assert isinstance(decomp.frags, (list, tuple)) and all(0 < len(frag) for frag in decomp.frags), \
+                'invalid fragments. must be a list of non-empty lists of atom indices'
+            assert sorted(int(atom) for frag in decomp.frags for atom in frag) == list(range(mol.natm)), \
+                'invalid fragments. every atom must belong to exactly one fragment'
         # ndo decomposition
         assert isinstance(decomp.ndo, bool), \
             'invalid ndo argument. must be a bool'
         # multiprocessing
         assert isinstance(decomp.multiproc, bool), \
             'invalid multiprocessing argument. must be a bool'
+        # parallel mode
+        assert decomp.parallel in ['', 'procs', 'threads'], \
+            'invalid parallel mode. valid choices: none (default), `procs`, and `threads`'
+        assert decomp.n_workers is None or (isinstance(decomp.n_workers, int) and 0 < decomp.n_workers), \
+            'invalid number of workers. valid choices: None (default, all cores) or a positive int'
         # gauge origin
         assert isinstance(decomp.gauge_origin, (list, np.ndarray)), \
             'invalid gauge origin. must be a list or numpy array of ints/floats'
         # property
-        assert decomp.prop in ['energy', 'dipole'], \
-            'invalid property. valid choices: `energy` (default) and `dipole`'
+        assert decomp.prop in ['energy', 'dipole'] or \
+               (isinstance(decomp.prop, (list, tuple)) and 0 < len(decomp.prop) and \
+                len(set(decomp.prop)) == len(decomp.prop) and set(decomp.prop) <= {'energy', 'dipole'}), \
+            'invalid property. valid choices: `energy` (default) and `dipole`, or a list of these'
         # write
         assert isinstance(decomp.write, str), \
             'invalid write format argument. must be a str'
         assert decomp.write in ['', 'cube', 'numpy'], \
             'invalid write format. valid choices: `cube` and `numpy`'
+        # checkpoint file
+        assert isinstance(decomp.chkfile, str), \
+            'invalid checkpoint file argument. must be a str'
+        # auxiliary basis for density-fitted coulomb and exchange operators
+        assert decomp.auxbasis is None or isinstance(decomp.auxbasis, str), \
+            'invalid auxiliary basis. valid choices: None (default, use the mean-field object) or a basis name'
+        # screening threshold of population weights
+        assert isinstance(decomp.weight_thres, float) and 0. <= decomp.weight_thres, \
+            'invalid weight screening threshold. valid choices: 0. (default, no screening) or a positive float'
+        # memory budget
+        assert decomp.max_memory is None or (isinstance(decomp.max_memory, (int, float)) and 0 < decomp.max_memory), \
+            'invalid memory budget. valid choices: None (default, no budget) or a positive number (in MB)'
+        # grid block size
+        assert decomp.grid_blksize is None or (isinstance(decomp.grid_blksize, int) and 0 < decomp.grid_blksize), \
+            'invalid grid block size. valid choices: None (default, full grid) or a positive int'
         # verbosity
         assert isinstance(decomp.verbose, int), \
             'invalid verbosity. valid choices: 0 <= `verbose` (default: 0)'
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+export module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import os
+import glob
+import shutil
+import struct
+import zipfile
+import importlib.util
+import h5py
+import numpy as np
+from typing import Dict, List, Iterator, Union, Optional, Any
+
+from .decomp import COMP_KEYS
+
+# pyarrow is imported on first use
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+# file formats (by file extension)
+FORMATS = {'.npz': 'npz', '.h5': 'hdf5', '.hdf5': 'hdf5', '.parquet': 'parquet'}
+# tables of atom (or fragment) rows, orbital rows, and record (molecule or frame) rows
+TABLES = ('atoms', 'orbitals', 'records')
+# number of buffered atom and orbital rows
+BUFFER_ROWS = 100000
+
+
+def tables(res: Dict[str, Any], record: int = 0, **meta: Any) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        this function returns the columns of the atom (or fragment), orbital, and record tables of a result dictionary
+        (as returned by main()). contributions of multiple properties are prefixed by the property (e.g., `energy/el`),
+        and vector contributions are kept as (rows, 3) columns
+        """
+        atoms: Dict[str, np.ndarray] = {}
+        orbs: Dict[str, np.ndarray] = {}
+        records: Dict[str, np.ndarray] = {'record': np.array([record], dtype=np.int64)}
+        # property dictionaries
+        if 'el' in res:
+            props = [('', res)]
+        else:
+            props = [(prop + '/', res_prop) for prop, res_prop in res.items() \
+                     if isinstance(res_prop, dict)]
+        # columns
+        for prefix, res_prop in props:
+            for key, val in res_prop.items():
+                if key in COMP_KEYS + ['charge_atom']:
+                    if isinstance(val, (list, tuple)):
+                        # orbital contributions of both spins
+                        orbs[prefix + key] = np.concatenate(val)
+                    else:
+                        atoms[prefix + key] = np.asarray(val)
+                elif key == 'mo_occ':
+                    orbs['spin'] = np.concatenate([np.full(len(occ), spin, dtype=np.int8) for spin, occ in enumerate(val)])
+                    orbs['mo'] = np.concatenate([np.arange(len(occ), dtype=np.int64) for occ in val])
+                    orbs['mo_occ'] = np.concatenate(val)
+                elif key == 'orbsym':
+                    orbs['orbsym'] = np.concatenate([np.asarray(sym, dtype=str) for sym in val])
+                elif isinstance(val, (bool, int, float, str, np.generic)):
+                    records[prefix + key] = np.array([val])
+        # user-defined record information
+        for key, val in meta.items():
+            assert isinstance(val, (bool, int, float, str, np.generic)), \
+                'invalid record information ({:}). must be a scalar'.format(key)
+            records[key] = np.array([val])
+        # record index and number of rows
+        res_tables = {'atoms': atoms, 'orbitals': orbs, 'records': records}
+        for table in TABLES[:2]:
+            n_rows = {val.shape[0] for val in res_tables[table].values()}
+            assert len(n_rows) <= 1, 'invalid result dictionary. columns of different lengths: {:}'.format(table)
+            n_rows = n_rows.pop() if n_rows else 0
+            records['n_' + table] = np.array([n_rows], dtype=np.int64)
+            if 0 < n_rows:
+                res_tables[table] = {'record': np.full(n_rows, record, dtype=np.int64), **res_tables[table]}
+        return res_tables
+
+
+class ResultsWriter(object):
+        """
+        this class writes the results of one or more molecules (or frames) to a columnar binary file (compressed npz,
+        hdf5, or a directory of parquet files). rows are buffered and flushed in chunks, and mode `a` appends to an
+        existing file. uncompressed npz and hdf5 files may be read back memory-mapped (cf. read_chunks())
+        """
+        def __init__(self, fname: str, fmt: Optional[str] = None, mode: str = 'w', \
+                     compress: bool = True, buffer_rows: int = BUFFER_ROWS) -> None:
+            """
+            init ResultsWriter
+            """
+            self.fname = fname
+            self.fmt = _fmt(fname, fmt)
+            self.compress = compress
+            self.buffer_rows = buffer_rows
+            assert mode in ['w', 'a'], \
+                'invalid mode. valid choices: `w` (default) or `a` (append)'
+            assert self.fmt != 'parquet' or PYARROW_AVAILABLE, \
+                'parquet export requires pyarrow'
+            # existing file
+            if mode == 'w':
+                if os.path.isdir(fname):
+                    shutil.rmtree(fname)
+                elif os.path.isfile(fname):
+                    os.remove(fname)
+            # next chunk and record
+            self.n_chunk = len(_chunks(fname, self.fmt, 'records'))
+            self.n_record = 0
+            for chunk in read_chunks(fname, 'records', self.fmt):
+                self.n_record = max(self.n_record, int(np.max(chunk['record'])) + 1)
+            # buffer
+            self.buffer: Dict[str, List[Dict[str, np.ndarray]]] = {table: [] for table in TABLES}
+            self.n_rows = 0
+
+        def append(self, res: Dict[str, Any], **meta: Any) -> int:
+            """
+            this function appends a result dictionary (and scalar record information) and returns its record index
+            """
+            record = self.n_record
+            res_tables = tables(res, record, **meta)
+            for table, columns in res_tables.items():
+                if columns:
+                    if self.buffer[table]:
+                        assert list(columns) == list(self.buffer[table][0]), \
+                            'all results of a file must have the same columns: {:}'.format(table)
+                    self.buffer[table].append(columns)
+            self.n_record += 1
+            self.n_rows += int(res_tables['records']['n_atoms'][0] + res_tables['records']['n_orbitals'][0])
+            if self.buffer_rows <= self.n_rows:
+                self.flush()
+            return record
+
+        def flush(self) -> None:
+            """
+            this function writes all buffered rows as a new chunk
+            """
+            if not self.buffer['records']:
+                return
+            chunk = {table: {key: np.concatenate([columns[key] for columns in self.buffer[table]]) \
+                             for key in self.buffer[table][0]} \
+                     for table in TABLES if self.buffer[table]}
+            self.buffer = {table: [] for table in TABLES}
+            self.n_rows = 0
+            if self.fmt == 'npz':
+                _write_npz(self.fname, chunk, self.n_chunk, self.compress)
+            elif self.fmt == 'hdf5':
+                _write_hdf5(self.fname, chunk, self.n_chunk, self.compress)
+            else:
+                _write_parquet(self.fname, chunk, self.n_chunk, self.compress)
+            self.n_chunk += 1
+
+        def close(self) -> None:
+            """
+            this function flushes all buffered rows
+            """
+            self.flush()
+
+        def __enter__(self) -> 'ResultsWriter':
+            """
+            enter context
+            """
+            return self
+
+        def __exit__(self, *args: Any) -> None:
+            """
+            exit context (flush buffered rows)
+            """
+            self.close()
+
+
+def write_results(fname: str, res: Union[Dict[str, Any], List[Dict[str, Any]]], \
+                  fmt: Optional[str] = None, mode: str = 'w', compress: bool = True) -> None:
+        """
+        this function writes one or more result dictionaries to a columnar binary file
+        """
+        with ResultsWriter(fname, fmt, mode, compress) as writer:
+            for res_record in ([res] if isinstance(res, dict) else res):
+                writer.append(res_record)
+
+
+def read_results(fname: str, table: str = 'atoms', fmt: Optional[str] = None, \
+                 mmap: bool = False) -> Dict[str, np.ndarray]:
+        """
+        this function returns the columns of a table (`atoms`, `orbitals`, or `records`) of a results file
+        (columns are only memory-mapped without copies for files written in a single chunk)
+        """
+        chunks = list(read_chunks(fname, table, fmt, mmap))
+        if len(chunks) == 1:
+            return chunks[0]
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in (chunks[0] if chunks else {})}
+
+
+def read_chunks(fname: str, table: str = 'atoms', fmt: Optional[str] = None, \
+                mmap: bool = False) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        this function yields the columns of a table of a results file chunk by chunk
+        (with mmap, the columns of uncompressed npz and hdf5 files are memory-mapped, and parquet files are read
+        through memory maps)
+        """
+        assert table in TABLES, \
+            'invalid table. valid choices: {:}'.format(TABLES)
+        fmt = _fmt(fname, fmt)
+        for chunk, columns in sorted(_chunks(fname, fmt, table).items()):
+            if fmt == 'npz':
+                yield {key: _read_npz(fname, '{:}/{:}/{:06d}.npy'.format(table, key, chunk), mmap) for key in columns}
+            elif fmt == 'hdf5':
+                yield {key: _read_hdf5(fname, '{:}/{:}/{:06d}'.format(table, key, chunk), mmap) for key in columns}
+            else:
+                yield _read_parquet(os.path.join(fname, '{:}-{:06d}.parquet'.format(table, chunk)), mmap)
+
+
+def _fmt(fname: str, fmt: Optional[str]) -> str:
+        """
+        this function returns the format of a results file
+        """
+        if fmt is None:
+            fmt = FORMATS.get(os.path.splitext(fname)[1].lower())
+        assert fmt in ['npz', 'hdf5', 'parquet'], \
+            'invalid export format. valid choices: `npz`, `hdf5`, or `parquet` (or file extensions {:})'.format(tuple(FORMATS))
+        return fmt
+
+
+def _chunks(fname: str, fmt: str, table: str) -> Dict[int, List[str]]:
+        """
+        this function returns the columns of all chunks of a table of a results file
+        """
+        chunks: Dict[int, List[str]] = {}
+        if fmt == 'npz' and os.path.isfile(fname):
+            with zipfile.ZipFile(fname, 'r') as zf:
+                for name in zf.namelist():
+                    if name.startswith(table + '/'):
+                        key, chunk = name[len(table) + 1:-len('.npy')].rsplit('/', 1)
+                        chunks.setdefault(int(chunk), []).append(key)
+        elif fmt == 'hdf5' and os.path.isfile(fname):
+            with h5py.File(fname, 'r') as f:
+                if table in f:
+                    # column names may contain `/` (nested groups)
+                    def _add(name: str, obj: Union[h5py.Group, h5py.Dataset]) -> None:
+                        if isinstance(obj, h5py.Dataset):
+                            key, chunk = name.rsplit('/', 1)
+                            chunks.setdefault(int(chunk), []).append(key)
+                    f[table].visititems(_add)
+        elif fmt == 'parquet' and os.path.isdir(fname):
+            for path in glob.glob(os.path.join(fname, '{:}-*.parquet'.format(table))):
+                chunks[int(os.path.basename(path)[len(table) + 1:-len('.parquet')])] = []
+        return chunks
+
+
+def _write_npz(fname: str, chunk: Dict[str, Dict[str, np.ndarray]], n_chunk: int, compress: bool) -> None:
+        """
+        this function writes a chunk of columns as npy members of a zip archive
+        """
+        with zipfile.ZipFile(fname, 'a' if os.path.isfile(fname) else 'w', \
+                             zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED) as zf:
+            for table, columns in chunk.items():
+                for key, val in columns.items():
+                    with zf.open('{:}/{:}/{:06d}.npy'.format(table, key, n_chunk), 'w', force_zip64=True) as f:
+                        np.lib.format.write_array(f, np.ascontiguousarray(val), allow_pickle=False)
+
+
+def _read_npz(fname: str, name: str, mmap: bool) -> np.ndarray:
+        """
+        this function reads a npy member of a zip archive (memory-mapped if stored uncompressed)
+        """
+        with zipfile.ZipFile(fname, 'r') as zf:
+            info = zf.getinfo(name)
+            if not mmap or info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as f:
+                    return np.lib.format.read_array(f, allow_pickle=False)
+        with open(fname, 'rb') as f:
+            # skip local file header
+            f.seek(info.header_offset)
+            header = f.read(30)
+            f.seek(info.header_offset + 30 + struct.unpack('<H', header[26:28])[0] + struct.unpack('<H', header[28:30])[0])
+            # npy header
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+        if 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(fname, dtype=dtype, mode='r', offset=offset, shape=shape, order='F' if fortran_order else 'C')
+
+
+def _write_hdf5(fname: str, chunk: Dict[str, Dict[str, np.ndarray]], n_chunk: int, compress: bool) -> None:
+        """
+        this function writes a chunk of columns as hdf5 datasets (contiguous unless compressed)
+        """
+        with h5py.File(fname, 'a') as f:
+            for table, columns in chunk.items():
+                for key, val in columns.items():
+                    # hdf5 has no unicode arrays of fixed width
+                    if val.dtype.kind == 'U':
+                        val = np.char.encode(val, 'utf-8')
+                    f.create_dataset('{:}/{:}/{:06d}'.format(table, key, n_chunk), data=val, \
+                                     compression='gzip' if compress and 0 < val.size else None)
+
+
+def _read_hdf5(fname: str, name: str, mmap: bool) -> np.ndarray:
+        """
+        this function reads a hdf5 dataset (memory-mapped if contiguous)
+        """
+        with h5py.File(fname, 'r') as f:
+            dset = f[name]
+            offset = dset.id.get_offset() if mmap else None
+            if offset is None:
+                val = dset[()]
+            else:
+                val = np.memmap(fname, dtype=dset.dtype, mode='r', offset=offset, shape=dset.shape)
+        if val.dtype.kind == 'S':
+            val = np.char.decode(val, 'utf-8')
+        return val
+
+
+def _write_parquet(fname: str, chunk: Dict[str, Dict[str, np.ndarray]], n_chunk: int, compress: bool) -> None:
+        """
+        this function writes a chunk of columns as one parquet file per table
+        (vector columns are stored as fixed-size lists)
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(fname, exist_ok=True)
+        for table, columns in chunk.items():
+            arrays = []
+            for val in columns.values():
+                if val.ndim == 1:
+                    arrays.append(pa.array(val))
+                else:
+                    arrays.append(pa.FixedSizeListArray.from_arrays(pa.array(val.reshape(-1)), val.shape[1]))
+            pq.write_table(pa.Table.from_arrays(arrays, names=list(columns)), \
+                           os.path.join(fname, '{:}-{:06d}.parquet'.format(table, n_chunk)), \
+                           compression='zstd' if compress else 'none')
+
+
+def _read_parquet(path: str, mmap: bool) -> Dict[str, np.ndarray]:
+        """
+        this function reads the columns of a parquet file
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = {}
+        pa_table = pq.read_table(path, memory_map=mmap)
+        for key, col in zip(pa_table.column_names, pa_table.columns):
+            col = col.combine_chunks()
+            if pa.types.is_fixed_size_list(col.type):
+                columns[key] = col.flatten().to_numpy(zero_copy_only=False).reshape(len(col), col.type.list_size)
+            elif pa.types.is_string(col.type):
+                columns[key] = np.asarray(col.to_pylist(), dtype=str)
+            else:
+                columns[key] = col.to_numpy(zero_copy_only=False)
+        return columns
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+integrals module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from pyscf import gto
+from typing import Dict, Tuple, Union, Callable, Any
+
+# default memory budget of the integral cache (in MB)
+MAX_MEMORY = 2000
+
+
+class IntegralCache(object):
+        """
+        this class is an in-process cache of integrals with a memory budget and lru eviction
+        """
+        def __init__(self, max_memory: float = MAX_MEMORY) -> None:
+            """
+            init IntegralCache
+            """
+            self.max_memory = max_memory
+            self.entries: 'OrderedDict[Tuple[Any, ...], np.ndarray]' = OrderedDict()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+        def get(self, key: Tuple[Any, ...], compute: Callable[[], np.ndarray]) -> np.ndarray:
+            """
+            this function returns a (read-only) cached array or computes and caches it
+            """
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+            arr = compute()
+            arr.flags.writeable = False
+            # arrays exceeding the memory budget are not cached
+            if arr.nbytes <= self.max_memory * 1e6:
+                self.entries[key] = arr
+                self.nbytes += arr.nbytes
+                self._evict()
+            return arr
+
+        def _evict(self) -> None:
+            """
+            this function evicts least recently used arrays until the cache fits the memory budget
+            """
+            while self.max_memory * 1e6 < self.nbytes:
+                self.nbytes -= self.entries.popitem(last=False)[1].nbytes
+                self.evictions += 1
+
+        def clear(self) -> None:
+            """
+            this function empties the cache and resets its statistics
+            """
+            self.entries.clear()
+            self.nbytes = self.hits = self.misses = self.evictions = 0
+
+        def info(self) -> Dict[str, Union[int, float]]:
+            """
+            this function returns cache statistics
+            """
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, \
+                    'entries': len(self.entries), 'memory': self.nbytes / 1e6, 'max_memory': self.max_memory}
+
+
+# package-wide integral cache
+CACHE = IntegralCache()
+
+
+def mol_key(mol: gto.Mole) -> str:
+        """
+        this function returns a hash of the atoms, coordinates, basis, cart/sph setting, and origins of a mol object
+        (coordinates, basis exponents/coefficients, and common/rinv origins are all stored in mol._env)
+        """
+        key = hashlib.sha1()
+        for arr in (mol._atm, mol._bas, mol._env):
+            key.update(np.ascontiguousarray(arr).tobytes())
+        key.update(bytes(str(mol.cart), 'utf-8'))
+        return key.hexdigest()
+
+
+def layout_key(mol: gto.Mole) -> str:
+        """
+        this function returns a hash of the atoms and basis layout of a mol object (independent of its geometry)
+        """
+        key = hashlib.sha1()
+        for arr in (mol._atm, mol._bas):
+            key.update(np.ascontiguousarray(arr).tobytes())
+        key.update(bytes(str(mol.cart), 'utf-8'))
+        return key.hexdigest()
+
+
+def intor(mol: gto.Mole, intor_name: str, comp: Union[None, int] = None, hermi: int = 0) -> np.ndarray:
+        """
+        this function returns (cached) integrals of mol.intor()
+        """
+        return CACHE.get((mol_key(mol), intor_name, comp, hermi), \
+                         lambda: mol.intor(intor_name, comp=comp, hermi=hermi))
+
+
+def intor_symmetric(mol: gto.Mole, intor_name: str, comp: Union[None, int] = None) -> np.ndarray:
+        """
+        this function returns (cached) hermitian integrals of mol.intor_symmetric()
+        """
+        return intor(mol, intor_name, comp=comp, hermi=1)
+
+
+def cached(key: Tuple[Any, ...], compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        this function returns (cached) results of other integral-based quantities
+        """
+        return CACHE.get(key, compute)
+
+
+def cache_info() -> Dict[str, Union[int, float]]:
+        """
+        this function returns hit/miss statistics and memory usage of the integral cache
+        """
+        return CACHE.info()
+
+
+def cache_clear() -> None:
+        """
+        this function empties the integral cache
+        """
+        CACHE.clear()
+
+
+def cache_max_memory(max_memory: float) -> None:
+        """
+        this function sets the memory budget (in MB) of the integral cache
+        """
+        CACHE.max_memory = max_memory
+        CACHE._evict()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+memory module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+from pyscf import gto, scf, dft, df
+from pyscf.dft import numint
+from typing import Dict, Union, Any
+
+from .decomp import DecompCls
+from .parallel import split, mode
+from .properties import xc_ao_deriv
+
+# number of ao components for a given level of ao derivatives
+NCOMP = {0: 1, 1: 4, 2: 10}
+# resident memory of a worker process (interpreter and imported modules, in MB)
+WORKER_MEMORY = 100.
+# smallest grid block size (in units of the pyscf block size)
+MIN_BLKSIZE = numint.BLKSIZE
+
+
+def plan(mol: gto.Mole, mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], \
+         decomp: DecompCls, n_states: int = 1) -> Dict[str, Any]:
+        """
+        this function returns estimates of the peak memory (in MB) of the individual stages of a decomposition
+        of one or more states, as well as the grid block size and number of workers to use. for a given memory
+        budget (decomp.max_memory), the grid block size (unless given) and, if needed, the number of workers are
+        chosen such that the estimated peak fits the budget, and a MemoryError is raised if this is impossible
+        """
+        # dimensions
+        nao = mol.nao_nr()
+        nocc = max(mol.nelec)
+        npair = nao * (nao + 1) // 2
+        prop_types = [decomp.prop] if isinstance(decomp.prop, str) else decomp.prop
+        energy = 'energy' in prop_types
+        dft_calc = isinstance(mf, dft.rks.KohnShamDFT)
+
+        # number of workers
+        n_workers = split(decomp.parallel, decomp.n_workers)[0]
+        n_workers_plan = decomp.n_workers
+
+        # words per grid point of a block (ao values, rho intermediates, and orbital densities)
+        if energy and dft_calc:
+            xc_type, ao_deriv = xc_ao_deriv(mf.xc)
+            ngrids = mf.grids.weights.size if mf.grids.weights is not None else 0
+            words_grid = (NCOMP[ao_deriv] + 3 + (9 if xc_type == 'MGGA' else 0)) * nao + 2 * nocc + 16
+            words_grid *= n_states if decomp.part == 'eda' else 1
+            nlc = mf.nlc.upper() == 'VV10'
+            ngrids_nlc = mf.nlcgrids.weights.size if nlc and mf.nlcgrids.weights is not None else 0
+        else:
+            ngrids = ngrids_nlc = words_grid = 0
+            nlc = False
+
+        # memory of state-independent and state-specific matrices
+        stages = {'base': (12 + 4 * n_states) * nao ** 2 * 8 / 1.e6}
+        # coulomb and exchange operators (incl. 3-center integrals for density fitting)
+        if energy:
+            auxbasis = decomp.auxbasis
+            if auxbasis is None and getattr(mf, 'with_df', None) is not None:
+                auxbasis = mf.with_df.auxbasis
+                if auxbasis is None:
+                    auxbasis = df.make_auxbasis(mol)
+            naux = 0 if auxbasis is None else df.make_auxmol(mol, auxbasis).nao_nr()
+            stages['jk'] = (naux * npair + 4 * nao ** 2) * 8 / 1.e6
+            # in-core eri tensor (8-fold symmetry) of conventional scf (cf. pyscf.scf.hf.RHF.get_jk())
+            if naux == 0 and (getattr(mf, '_eri', None) is not None or mol.incore_anyway or \
+                              nao ** 4 / 1.e6 < mf.max_memory):
+                stages['jk'] += npair * (npair + 1) // 2 * 8 / 1.e6
+            # nuclear potential (blocked 3-center integrals)
+            stages['nuc'] = (8 * nao ** 2 + npair) * 8 / 1.e6
+        # nlc energy densities (rho and vv10 intermediates on the full nlc grid)
+        if nlc:
+            stages['nlc'] = 16 * n_states * ngrids_nlc * 8 / 1.e6
+        # population weights and partitioning
+        stages['partition'] = (4 * nocc * mol.natm + 2 * nao ** 2) * n_states * 8 / 1.e6
+
+        # budget
+        max_memory = decomp.max_memory
+        overhead = WORKER_MEMORY * n_workers if mode(decomp.parallel) == 'procs' and 1 < n_workers else 0.
+        grid_blksize = decomp.grid_blksize
+        if 0 < ngrids:
+            if max_memory is not None and grid_blksize is None:
+                # largest block size (rounded to the pyscf block size) for which all concurrent blocks fit the budget
+                mem_grid = max_memory - stages['base'] - overhead
+                blksize = int(mem_grid * 1.e6 / (8 * words_grid * n_workers)) // MIN_BLKSIZE * MIN_BLKSIZE
+                if blksize < MIN_BLKSIZE:
+                    # fewer workers
+                    worker_memory = WORKER_MEMORY if 0. < overhead else 0.
+                    n_workers = max(1, int((max_memory - stages['base']) / \
+                                           (8 * words_grid * MIN_BLKSIZE / 1.e6 + worker_memory)))
+                    n_workers_plan = n_workers
+                    overhead = worker_memory * n_workers
+                    blksize = MIN_BLKSIZE
+                # default block size is the full grid divided among workers
+                grid_blksize = min(blksize, -(-max(ngrids, ngrids_nlc) // n_workers))
+            blksize = grid_blksize if grid_blksize is not None else -(-ngrids // n_workers)
+            stages['xc'] = 8 * words_grid * min(blksize, ngrids) * min(n_workers, -(-ngrids // blksize)) / 1.e6 + overhead
+            if nlc:
+                stages['nlc'] += 8 * (NCOMP[1] * nao + 16) * min(blksize, ngrids_nlc) / 1.e6
+
+        # peak memory
+        peak = stages['base'] + max(val for key, val in stages.items() if key != 'base')
+        res = {'stages': stages, 'peak': peak, 'max_memory': max_memory, \
+               'grid_blksize': grid_blksize, 'n_workers': n_workers_plan}
+
+        # fail fast
+        if max_memory is not None and max_memory < peak:
+            raise MemoryError('estimated peak memory exceeds the memory budget' + info(res))
+
+        return res
+
+
+def info(res: Dict[str, Any]) -> str:
+        """
+        this function returns a string with the memory estimates of a plan
+        """
+        string = '\n *** memory plan (MB): ***\n'
+        for key, val in res['stages'].items():
+            string += ' {:<12s}{:>12.1f}\n'.format(key, val)
+        string += ' {:<12s}{:>12.1f}\n'.format('peak', res['peak'])
+        if res['max_memory'] is not None:
+            string += ' {:<12s}{:>12.1f}\n'.format('budget', res['max_memory'])
+        string += ' grid block size = {:}, workers = {:}\n'.format(res['grid_blksize'], res['n_workers'])
+        return string
@@ -10,21 +10,37 @@ __maintainer__ = 'Dr. Janus Juul Eriksen'
 __email__ = 'janus.eriksen@bristol.ac.uk'
 __status__ = 'Development'
 
-import multiprocessing as mp
+import os
+import io
+import re
+import threading
 import numpy as np
+import scipy.linalg
+import scipy.sparse
+from functools import reduce
+from time import perf_counter
 from pyscf import gto, scf, dft, lo, lib
 from typing import List, Tuple, Dict, Union, Any
 
-from .tools import dim, make_rdm1, contract
+from .parallel import execute, ranges, split, mode, info as parallel_info
+from .tools import dim, contract
+from .integrals import intor_symmetric, cached, mol_key
 
 LOC_CONV = 1.e-10
 
 
 def loc_orbs(mol: gto.Mole, mo_coeff_in: np.ndarray, \
              mo_occ: np.ndarray, variant: str, ndo: bool, \
-             loc_lst: Union[None, List[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+             loc_lst: Union[None, List[Any]], \
+             mo_guess: Union[None, Tuple[np.ndarray, np.ndarray]] = None, \
+             parallel: Union[bool, str] = '', n_workers: Union[None, int] = None, \
+             verbose: int = 0, stats: Union[None, List[Dict[str, Any]]] = None, \
+             iao_ctx: Union[None, 'IAOContext'] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         this function returns a set of localized MOs of a specific variant
+        (optionally starting from guess orbitals spanning the same occupied space, cf. project_orbs()).
+        the independent localizations of all spins and loc_lst blocks are distributed over a pool of workers,
+        and the iteration count, timing, and worker of each of them are appended to stats (if given)
         """
         # rhf reference
         if mo_occ[0].size == mo_occ[1].size:
@@ -37,7 +53,7 @@ def loc_orbs(mol: gto.Mole, mo_coeff_in: np.ndarray, \
             raise NotImplementedError('localization of NDOs is not implemented')
 
         # overlap matrix
-        s = mol.intor_symmetric('int1e_ovlp')
+        s = intor_symmetric(mol, 'int1e_ovlp')
 
         # molecular dimensions
         alpha, beta = dim(mo_occ)
@@ -49,57 +65,200 @@ def loc_orbs(mol: gto.Mole, mo_coeff_in: np.ndarray, \
             for i, idx_arr in enumerate(loc_lst):
                 assert np.sum([len(idx) for idx in idx_arr]) == (alpha, beta)[i].size, 'loc_lst does not cover all occupied orbitals'
 
+        # independent localization blocks of all spins
+        blocks: List[Tuple[int, np.ndarray]] = []
+        for i, spin_mo in enumerate((alpha, beta)):
+            # selective localization
+            if loc_lst is None:
+                idx_arr = spin_mo.reshape(1, -1)
+            else:
+                idx_arr = loc_lst[i]
+            blocks += [(i, np.asarray(idx)) for idx in idx_arr]
+            # closed-shell reference
+            if rhf:
+                break
+
+        # kernel data (starting orbitals of all spins)
+        mo_start = tuple(mo_coeff_in) if mo_guess is None else tuple(mo_guess)
+        data = {'mol': mol, 's': s, 'variant': variant, 'warm': mo_guess is not None, \
+                'mo': mo_start, 'blocks': blocks}
+        # orthogonalized IAOs of all blocks
+        if 'ibo' in variant:
+            if iao_ctx is None:
+                iao_ctx = IAOContext(mol)
+            data['iao'] = tuple(iao_ctx.get(mo_start[i][:, idx], i, idx) for i, idx in blocks)
+        # execute kernel
+        res = execute(_loc_block, [(k,) for k in range(len(blocks))], data, parallel, n_workers)
+
         # init mo_coeff_out
         mo_coeff_out = (np.zeros_like(mo_coeff_in[0]), np.zeros_like(mo_coeff_in[1]))
 
+        # collect localized orbitals
+        for (i, idx), (mo, _, _, _) in zip(blocks, res):
+            mo_coeff_out[i][:, idx] = mo
+            # closed-shell reference
+            if rhf:
+                mo_coeff_out[i+1][:, idx] = mo
+
+        # localization statistics
+        if stats is not None:
+            stats += [{'spin': i, 'block': k, 'n_orb': idx.size, 'n_iter': n_iter, 'time': t, \
+                       'pid': worker[0], 'thread': worker[1]} \
+                      for k, ((i, idx), (_, n_iter, t, worker)) in enumerate(zip(blocks, res))]
+
+        # verbose print
+        if 0 < verbose:
+            print('\n *** localization ({:s}): ***'.format(variant))
+            if mode(parallel):
+                print(parallel_info(parallel, n_workers, len(blocks)))
+            print(' spin  block  orbs  iterations  time (s)')
+            for k, ((i, idx), (_, n_iter, t, _)) in enumerate(zip(blocks, res)):
+                print('  {:s}    {:>4d}  {:>4d}  {:>10d}  {:>8.2f}'.format('a' if i == 0 else 'b', k, idx.size, n_iter, t))
+
+        return mo_coeff_out
+
+
+def _loc_block(data: Dict[str, Any], k: int) -> Tuple[np.ndarray, int, float, Tuple[int, str]]:
+        """
+        this function localizes a single block of orbitals and returns the localized orbitals,
+        the number of (macro) iterations (-1 if unknown), the wall time, and the worker (process id and thread name)
+        """
+        # starting orbitals
+        i, idx = data['blocks'][k]
+        mo = data['mo'][i][:, idx]
+        mol, variant = data['mol'], data['variant']
+        time = perf_counter()
+        if variant in ['fb', 'pm']:
+            # foster-boys or pipek-mezey procedure
+            loc = lo.Boys(mol, mo) if variant == 'fb' else lo.PM(mol, mo)
+            loc.conv_tol = LOC_CONV
+            # iteration count
+            it = [0]
+            def callback(env: Dict[str, Any]) -> None:
+                it[0] = env['imacro'] + 1
+            # FB/PM MOs
+            if data['warm']:
+                mo = loc.kernel(mo_coeff=mo, callback=callback)
+            else:
+                mo = loc.kernel(callback=callback)
+            n_iter = it[0]
+        elif 'ibo' in variant:
+            # IBOs (iteration count parsed from the final note of the localization, -1 if not found)
+            log = lib.logger.Logger(io.StringIO(), lib.logger.NOTE)
+            mo = lo.ibo.ibo(mol, mo, iaos=data['iao'][k], s=data['s'], grad_tol = LOC_CONV, \
+                            exponent=int(variant[-1]), verbose=log)
+            match = re.search(r'(\d+) iter', log.stdout.getvalue())
+            n_iter = -1 if match is None else int(match.group(1))
+        return mo, n_iter, perf_counter() - time, (os.getpid(), threading.current_thread().name)
+
+
+def project_orbs(mol: gto.Mole, mo_coeff: Tuple[np.ndarray, np.ndarray], mo_occ: Tuple[np.ndarray, np.ndarray], \
+                 mol_prev: gto.Mole, mo_prev: Tuple[np.ndarray, np.ndarray], \
+                 loc_lst: Union[None, List[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        this function returns guess orbitals for loc_orbs(), i.e., the occupied orbitals of mo_coeff rotated
+        (within each localization space) to maximally resemble orbitals of another geometry (mol_prev, mo_prev)
+        """
+        # cross overlap matrix between the two geometries
+        s12 = gto.intor_cross('int1e_ovlp', mol, mol_prev)
+
+        # molecular dimensions
+        alpha, beta = dim(mo_occ)
+
+        # init guess orbitals
+        mo_guess = (mo_coeff[0].copy(), mo_coeff[1].copy())
+
         # loop over spins
         for i, spin_mo in enumerate((alpha, beta)):
 
-            # selective localization
+            # localization spaces
             if loc_lst is None:
                 idx_arr = spin_mo.reshape(1, -1)
             else:
-                idx_arr = loc_lst[i]
+                idx_arr = loc_lst[i if len(loc_lst) == 2 else 0]
 
-            # localize orbitals
+            # closest unitary rotation (polar decomposition of the mixed overlap)
             for idx in idx_arr:
-                if variant == 'fb':
-                    # foster-boys procedure
-                    loc = lo.Boys(mol, mo_coeff_in[i][:, idx])
-                    loc.conv_tol = LOC_CONV
-                    # FB MOs
-                    mo_coeff_out[i][:, idx] = loc.kernel()
-                elif variant == 'pm':
-                    # pipek-mezey procedure
-                    loc = lo.PM(mol, mo_coeff_in[i][:, idx])
-                    loc.conv_tol = LOC_CONV
-                    # PM MOs
-                    mo_coeff_out[i][:, idx] = loc.kernel()
-                elif 'ibo' in variant:
-                    # orthogonalized IAOs
-                    iao = lo.iao.iao(mol, mo_coeff_in[i][:, idx])
-                    iao = lo.vec_lowdin(iao, s)
-                    # IBOs
-                    mo_coeff_out[i][:, idx] = lo.ibo.ibo(mol, mo_coeff_in[i][:, idx], iaos=iao, \
-                                                         grad_tol = LOC_CONV, exponent=int(variant[-1]), verbose=0)
+                u, _, vt = np.linalg.svd(contract('pi,pq,qj->ij', mo_coeff[i][:, idx], s12, mo_prev[i][:, idx]))
+                mo_guess[i][:, idx] = np.dot(mo_coeff[i][:, idx], np.dot(u, vt))
 
-            # closed-shell reference
-            if rhf:
-                mo_coeff_out[i+1][:, spin_mo] = mo_coeff_out[i][:, spin_mo]
-                break
+        return mo_guess
 
-        return mo_coeff_out
+
+class IAOContext(object):
+        """
+        this class holds the IAO quantities of a state, i.e., the minao reference mol object and the
+        orthogonalized IAOs of its occupied spaces, such that these are built once and shared between
+        localization and populations
+        """
+        def __init__(self, mol: gto.Mole) -> None:
+            """
+            init IAOContext
+            """
+            self.mol = mol
+            self.pmol = lo.iao.reference_mol(mol)
+            self.iaos: Dict[Tuple[int, bytes], np.ndarray] = {}
+
+        def get(self, orbocc: np.ndarray, spin: int, idx: np.ndarray) -> np.ndarray:
+            """
+            this function returns the orthogonalized IAOs of the space spanned by orbocc
+            (the occupied orbitals idx of a given spin, which all orbitals spanning this space share)
+            """
+            key = (spin, np.asarray(idx, dtype=np.int64).tobytes())
+            if key not in self.iaos:
+                self.iaos[key] = iao_basis(self.mol, orbocc, self.pmol)
+            return self.iaos[key]
+
+
+def iao_basis(mol: gto.Mole, orbocc: np.ndarray, pmol: Union[None, gto.Mole] = None) -> np.ndarray:
+        """
+        this function returns the orthogonalized IAOs of a set of occupied orbitals (cf. lo.iao.iao()),
+        with the orbital-independent overlaps and cholesky factors cached per geometry
+        """
+        # mol object projected into minao basis
+        if pmol is None:
+            pmol = lo.iao.reference_mol(mol)
+        # overlap matrices
+        s1 = intor_symmetric(mol, 'int1e_ovlp')
+        s2 = intor_symmetric(pmol, 'int1e_ovlp')
+        key = (mol_key(mol), mol_key(pmol))
+        s12 = cached(('int1e_ovlp_cross',) + key, lambda: gto.intor_cross('int1e_ovlp', mol, pmol))
+        # cholesky factors
+        s1cd = (cached(('cho_factor', key[0]), lambda: scipy.linalg.cho_factor(s1)[0]), False)
+        s2cd = (cached(('cho_factor', key[1]), lambda: scipy.linalg.cho_factor(s2)[0]), False)
+        p12 = cached(('iao_p12',) + key, lambda: scipy.linalg.cho_solve(s1cd, s12))
+        # projected occupied orbitals
+        ctild = scipy.linalg.cho_solve(s2cd, np.dot(s12.T, orbocc))
+        ctild = scipy.linalg.cho_solve(s1cd, np.dot(s12, ctild))
+        ctild = lo.vec_lowdin(ctild, s1)
+        ccs1 = reduce(np.dot, (orbocc, orbocc.T, s1))
+        ccs2 = reduce(np.dot, (ctild, ctild.T, s1))
+        # IAOs
+        a = p12 + reduce(np.dot, (ccs1, ccs2, p12)) * 2 - np.dot(ccs1, p12) - np.dot(ccs2, p12)
+        return lo.vec_lowdin(a, s1)
+
+
+def frag_sum(arr: np.ndarray, frags: Union[None, List[List[int]]]) -> np.ndarray:
+        """
+        this function returns the fragment sums of atom-wise contributions (leading axis)
+        """
+        if frags is None:
+            return arr
+        # segment sums over the atoms of every fragment (in fragment order)
+        idx = np.concatenate([np.asarray(frag, dtype=np.int64) for frag in frags])
+        starts = np.cumsum([0] + [len(frag) for frag in frags[:-1]])
+        return np.add.reduceat(arr[idx], starts, axis=0)
 
 
 def assign_rdm1s(mol: gto.Mole, mo_coeff: np.ndarray, \
                  mo_occ: np.ndarray, pop: str, part: str, ndo: bool, \
-                 multiproc: bool, verbose: int, **kwargs: Any) -> List[np.ndarray]:
+                 parallel: Union[bool, str], verbose: int, \
+                 n_workers: Union[None, int] = None, iao_ctx: Union[None, IAOContext] = None, \
+                 frags: Union[None, List[List[int]]] = None, **kwargs: Any) -> List[np.ndarray]:
         """
         this function returns a list of population weights of each spin-orbital on the individual atoms
+        (or on the individual fragments, i.e., lists of atom indices)
         """
-        # declare nested kernel function in global scope
-        global get_weights
-
         # rhf reference
         if mo_occ[0].size == mo_occ[1].size:
             rhf = np.allclose(mo_coeff[0], mo_coeff[1]) and np.allclose(mo_occ[0], mo_occ[1])
@@ -107,7 +266,7 @@ def assign_rdm1s(mol: gto.Mole, mo_coeff: np.ndarray, \
             rhf = False
 
         # overlap matrix
-        s = mol.intor_symmetric('int1e_ovlp')
+        s = intor_symmetric(mol, 'int1e_ovlp')
 
         # molecular dimensions
         alpha, beta = dim(mo_occ)
@@ -120,15 +279,17 @@ def assign_rdm1s(mol: gto.Mole, mo_coeff: np.ndarray, \
             # ndo assertion
             if ndo:
                 raise NotImplementedError('IAO-based populations for NDOs is not implemented')
-            pmol = lo.iao.reference_mol(mol)
+            if iao_ctx is None:
+                iao_ctx = IAOContext(mol)
+            pmol = iao_ctx.pmol
         else:
             pmol = mol
 
-        # number of atoms
-        natm = pmol.natm
+        # number of atoms (or fragments)
+        natm = pmol.natm if frags is None else len(frags)
 
-        # AO labels
-        ao_labels = pmol.ao_labels(fmt=None)
+        # contiguous AO ranges of all atoms
+        ao_slices = pmol.aoslice_by_atom()[:, 2:]
 
         # overlap matrix
         if pop == 'mulliken':
@@ -136,19 +297,11 @@ def assign_rdm1s(mol: gto.Mole, mo_coeff: np.ndarray, \
         else:
             ovlp = np.eye(pmol.nao_nr())
 
-        def get_weights(orb_idx: int):
-            """
-            this function computes the full set of population weights
-            """
-            # get orbital
-            orb = mo[:, orb_idx].reshape(mo.shape[0], 1)
-            # orbital-specific rdm1
-            rdm1_orb = make_rdm1(orb, mocc[orb_idx])
-            # population weights of rdm1_orb
-            return _population(natm, ao_labels, ovlp, rdm1_orb)
+        # number of workers
+        n_procs = split(parallel, n_workers)[0]
 
         # init population weights array
-        weights = [np.zeros([n_spin, pmol.natm], dtype=np.float64), np.zeros([n_spin, pmol.natm], dtype=np.float64)]
+        weights = [np.zeros([n_spin, natm], dtype=np.float64), np.zeros([n_spin, natm], dtype=np.float64)]
 
         # loop over spin
         for i, spin_mo in enumerate((alpha, beta)):
@@ -157,20 +310,18 @@ def assign_rdm1s(mol: gto.Mole, mo_coeff: np.ndarray, \
             if pop == 'mulliken':
                 mo = mo_coeff[i][:, spin_mo]
             elif pop == 'iao':
-                iao = lo.iao.iao(mol, mo_coeff[i][:, spin_mo])
-                iao = lo.vec_lowdin(iao, s)
+                iao = iao_ctx.get(mo_coeff[i][:, spin_mo], i, spin_mo)
                 mo = contract('ki,kl,lj->ij', iao, s, mo_coeff[i][:, spin_mo])
             mocc = mo_occ[i][spin_mo]
+            # overlap matrix in mixed AO/MO basis
+            s_mo = contract('kl,li->ki', ovlp, mo)
 
-            # domain
-            domain = np.arange(spin_mo.size)
+            # domain of orbital ranges
+            domain = ranges(spin_mo.size, n_procs)
+            # kernel data
+            data = {'ao_slices': ao_slices, 'frags': frags, 'mo': mo, 's_mo': s_mo, 'mo_occ': mocc}
             # execute kernel
-            if multiproc:
-                n_threads = min(domain.size, lib.num_threads())
-                with mp.Pool(processes=n_threads) as pool:
-                    weights[i] = pool.map(get_weights, domain) # type:ignore
-            else:
-                weights[i] = list(map(get_weights, domain)) # type:ignore
+            weights[i] = np.concatenate(execute(_get_weights, domain, data, parallel, n_workers))
 
             # closed-shell reference
             if rhf:
@@ -179,30 +330,69 @@ def assign_rdm1s(mol: gto.Mole, mo_coeff: np.ndarray, \
 
         # verbose print
         if 0 < verbose:
-            symbols = tuple(pmol.atom_pure_symbol(i) for i in range(pmol.natm))
+            if frags is None:
+                symbols = tuple(pmol.atom_pure_symbol(i) for i in range(pmol.natm))
+            else:
+                symbols = tuple('F{:d}'.format(i) for i in range(natm))
             print('\n *** partial population weights: ***')
             print(' spin  ' + 'MO       ' + '      '.join(['{:}'.format(i) for i in symbols]))
             for i, spin_mo in enumerate((alpha, beta)):
-                for j in domain:
+                for j in range(spin_mo.size):
                     with np.printoptions(suppress=True, linewidth=200, formatter={'float': '{:6.3f}'.format}):
                         print('  {:s}    {:>2d}   {:}'.format('a' if i == 0 else 'b', spin_mo[j], weights[i][j]))
 
         return weights
 
 
-def _population(natm: int, ao_labels: np.ndarray, ovlp: np.ndarray, rdm1: np.ndarray) -> np.ndarray:
+def screen_weights(weights: List[np.ndarray], thres: float, \
+                   verbose: int = 0) -> Tuple[List[scipy.sparse.csr_matrix], float]:
         """
-        this function returns the mulliken populations on the individual atoms
+        this function returns sparse population weights (orbitals x atoms), in which weights below thres in
+        absolute value are discarded and the remaining weights of each orbital are rescaled to the original total,
+        as well as the total discarded weight
         """
-        # mulliken population array
-        pop = contract('ij,ji->i', rdm1, ovlp)
-        # init populations
-        populations = np.zeros(natm)
+        # init sparse weights
+        weights_sparse = []
+        discarded = 0.
+        # loop over spins
+        for i in range(2):
+            w = np.asarray(weights[i], dtype=np.float64)
+            # significant weights
+            mask = thres <= np.abs(w)
+            w_kept = np.where(mask, w, 0.)
+            discarded += np.sum(np.abs(w[~mask]))
+            # rescale to original orbital totals
+            tot_kept = np.sum(w_kept, axis=1)
+            scale = np.divide(np.sum(w, axis=1), tot_kept, out=np.ones_like(tot_kept), where=tot_kept != 0.)
+            weights_sparse.append(scipy.sparse.csr_matrix(w_kept * scale[:, None]))
+        # verbose print
+        if 0 < verbose:
+            print('\n *** screened population weights: ***')
+            print(' threshold = {:.1e}, significant weights = {:d} of {:d}, discarded weight = {:.3e}'. \
+                  format(thres, sum(w.nnz for w in weights_sparse), sum(np.prod(w.shape) for w in weights_sparse), discarded))
+        return weights_sparse, discarded
+
+
+def _get_weights(data: Dict[str, Any], orb_start: int, orb_end: int) -> np.ndarray:
+        """
+        this function computes the full set of population weights for a range of orbitals
+        """
+        return _population(data['ao_slices'], data['mo'][:, orb_start:orb_end], \
+                           data['s_mo'][:, orb_start:orb_end], data['mo_occ'][orb_start:orb_end], data['frags'])
 
-        # loop over AOs
-        for i, k in enumerate(ao_labels):
-            populations[k[0]] += pop[i]
 
-        return populations
+def _population(ao_slices: np.ndarray, mo: np.ndarray, s_mo: np.ndarray, mo_occ: np.ndarray, \
+                frags: Union[None, List[List[int]]] = None) -> np.ndarray:
+        """
+        this function returns the mulliken populations of the given orbitals on the individual atoms (or fragments)
+        """
+        # mulliken population array
+        pop = contract('ki,ki,i->ki', mo, s_mo, mo_occ)
+        # init populations
+        populations = np.zeros([ao_slices.shape[0], mo.shape[1]])
 
+        # segment sum over the contiguous AOs of every atom (atoms without AOs have zero populations)
+        nonempty = ao_slices[:, 0] < ao_slices[:, 1]
+        populations[nonempty] = np.add.reduceat(pop, ao_slices[nonempty, 0], axis=0)
 
+        return frag_sum(populations, frags).T
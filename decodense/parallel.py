@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+parallel module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import contextlib
+import multiprocessing as mp
+import numpy as np
+try:
+    from threadpoolctl import threadpool_limits
+    THREADPOOLCTL_AVAILABLE = True
+except ImportError:
+    THREADPOOLCTL_AVAILABLE = False
+from multiprocessing import shared_memory
+from multiprocessing.pool import ThreadPool
+from pyscf import gto, lib
+from typing import List, Tuple, Dict, Union, Callable, Any
+
+# worker state (populated once per worker process by _init_worker())
+WORKER_DATA: Dict[str, Any] = {}
+WORKER_SHM: List[shared_memory.SharedMemory] = []
+
+
+class SharedArrays(object):
+        """
+        this class places a set of read-only arrays in shared memory
+        """
+        def __init__(self, arrays: Dict[str, Any]) -> None:
+            """
+            init SharedArrays
+            """
+            self.shm: List[shared_memory.SharedMemory] = []
+            self.descs = {key: self._share(val) for key, val in arrays.items()}
+
+        def _share(self, val: Any) -> Any:
+            """
+            this function copies an array (or a tuple/list of arrays) into shared memory and returns its handle
+            """
+            if isinstance(val, (tuple, list)):
+                return ('seq', [self._share(v) for v in val])
+            arr = np.ascontiguousarray(val)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self.shm.append(shm)
+            return ('arr', (shm.name, arr.shape, arr.dtype.str))
+
+        def __enter__(self) -> 'SharedArrays':
+            """
+            enter context
+            """
+            return self
+
+        def __exit__(self, *args: Any) -> None:
+            """
+            release all shared memory blocks
+            """
+            for shm in self.shm:
+                shm.close()
+                shm.unlink()
+            self.shm = []
+
+
+def split(parallel: Union[bool, str], n_workers: Union[None, int] = None, \
+          n_tasks: Union[None, int] = None) -> Tuple[int, int]:
+        """
+        this function returns the number of outer workers (at most one per task) and the number of inner
+        (openmp/blas) threads per worker, such that workers * threads does not exceed the available cores
+        """
+        cores = lib.num_threads()
+        if not mode(parallel):
+            return 1, cores
+        if n_workers is None:
+            n_workers = cores
+        n_workers = max(1, min(n_workers, cores, cores if n_tasks is None else n_tasks))
+        return n_workers, max(1, cores // n_workers)
+
+
+def mode(parallel: Union[bool, str]) -> str:
+        """
+        this function returns the parallel mode ('' (serial), 'procs', or 'threads')
+        """
+        if isinstance(parallel, bool):
+            return 'procs' if parallel else ''
+        return parallel
+
+
+def info(parallel: Union[bool, str], n_workers: Union[None, int] = None, \
+         n_tasks: Union[None, int] = None) -> str:
+        """
+        this function returns a string with the split of cores between workers and inner threads
+        (for a given number of tasks)
+        """
+        n_workers, n_threads = split(parallel, n_workers, n_tasks)
+        return ' parallel: {:} ({:d} workers x {:d} openmp/blas threads, {:d} cores)'.format( \
+                   {'': 'serial', 'procs': 'processes', 'threads': 'threads'}[mode(parallel)], \
+                   n_workers, n_threads, lib.num_threads())
+
+
+def execute(kernel: Callable[..., Any], domain: List[Tuple[Any, ...]], data: Dict[str, Any], \
+            parallel: Union[bool, str] = '', n_workers: Union[None, int] = None) -> List[Any]:
+        """
+        this function executes kernel(data, *idx) for all idx in domain, either serially, on a pool of
+        threads (relying on numpy/blas and pyscf releasing the gil), or on a pool of worker processes. in the
+        latter case, all array-valued data are placed in shared memory, such that workers only receive
+        handles once and index ranges per task
+        """
+        n_workers, n_threads = split(parallel, n_workers, len(domain))
+        if n_workers <= 1:
+            return [kernel(data, *idx) for idx in domain]
+        if mode(parallel) == 'threads':
+            with _blas_limits(n_threads):
+                with ThreadPool(processes=n_workers, initializer=lib.num_threads, \
+                                initargs=(n_threads,)) as pool:
+                    return pool.starmap(kernel, [(data, *idx) for idx in domain])
+        # split data into arrays and static (picklable) data
+        arrays = {key: val for key, val in data.items() if _is_array(val)}
+        static = {key: (val.dumps() if isinstance(val, gto.Mole) else val) \
+                  for key, val in data.items() if key not in arrays}
+        mols = [key for key, val in data.items() if isinstance(val, gto.Mole)]
+        with SharedArrays(arrays) as shared:
+            with mp.Pool(processes=n_workers, initializer=_init_worker, \
+                         initargs=(shared.descs, static, mols, n_threads)) as pool:
+                return pool.starmap(_run_kernel, [(kernel, *idx) for idx in domain])
+
+
+def ranges(n: int, n_parts: int) -> List[Tuple[int, int]]:
+        """
+        this function returns (at most) n_parts contiguous index ranges covering range(n)
+        """
+        if n == 0:
+            return [(0, 0)]
+        return list(lib.prange(0, n, -(-n // max(n_parts, 1))))
+
+
+def _is_array(val: Any) -> bool:
+        """
+        this function returns whether val is an array or a non-empty (nested) tuple/list of arrays
+        """
+        if isinstance(val, np.ndarray):
+            return True
+        if isinstance(val, (tuple, list)) and 0 < len(val):
+            return all(_is_array(v) for v in val)
+        return False
+
+
+def _attach(desc: Tuple[str, Any]) -> Any:
+        """
+        this function returns array view(s) of shared memory block(s)
+        """
+        kind, val = desc
+        if kind == 'seq':
+            return tuple(_attach(v) for v in val)
+        name, shape, dtype = val
+        # workers share the resource tracker of the parent process, which owns (and unlinks) the block
+        shm = shared_memory.SharedMemory(name=name)
+        WORKER_SHM.append(shm)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        return arr
+
+
+def _blas_limits(n_threads: int) -> Any:
+        """
+        this function returns a context limiting the number of blas threads (if threadpoolctl is available)
+        """
+        if THREADPOOLCTL_AVAILABLE:
+            return threadpool_limits(limits=n_threads, user_api='blas')
+        return contextlib.nullcontext()
+
+
+def _init_worker(descs: Dict[str, Any], static: Dict[str, Any], \
+                 mols: List[str], n_threads: int) -> None:
+        """
+        this function initializes the data of a worker process
+        """
+        # openmp/blas threads per worker process
+        lib.num_threads(n_threads)
+        if THREADPOOLCTL_AVAILABLE:
+            threadpool_limits(limits=n_threads, user_api='blas')
+        WORKER_DATA.clear()
+        WORKER_DATA.update(static)
+        for key in mols:
+            WORKER_DATA[key] = gto.loads(static[key])
+        for key, desc in descs.items():
+            WORKER_DATA[key] = _attach(desc)
+
+
+def _run_kernel(kernel: Callable[..., Any], *idx: Any) -> Any:
+        """
+        this function executes a kernel on the data of a worker process
+        """
+        return kernel(WORKER_DATA, *idx)
@@ -11,47 +11,54 @@ __email__ = 'janus.eriksen@bristol.ac.uk'
 __status__ = 'Development'
 
 import numpy as np
-import multiprocessing as mp
-from itertools import starmap
-from pyscf import gto, scf, dft, df, lo, lib, solvent
+import scipy.sparse
+from pyscf import gto, scf, dft, df, lo, lib
 from pyscf.dft import numint
-from pyscf import tools as pyscf_tools
-from typing import List, Tuple, Dict, Union, Any
+from typing import List, Tuple, Dict, Union, Callable, Any
 
 from .tools import dim, make_rdm1, orbsym, contract
 from .decomp import COMP_KEYS
+from .parallel import execute, ranges, split
+from .integrals import intor_symmetric, cached, mol_key
+from .checkpoint import stage
+from .orbitals import frag_sum
+from .timings import timing
 
 # block size in _mm_pot()
 BLKSIZE = 200
+# energy components of the EDA kernel
+EDA_KEYS = ['coul', 'exch', 'kin', 'solvent', 'nuc_att_glob', 'nuc_att_loc']
 
 
 def prop_tot(mol: gto.Mole, mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], \
              mo_coeff: Tuple[np.ndarray, np.ndarray], mo_occ: Tuple[np.ndarray, np.ndarray], \
-             rdm1_eff: np.ndarray, pop: str, prop_type: str, part: str, ndo: bool, multiproc: bool, \
-             gauge_origin: np.ndarray, **kwargs: Any) -> Dict[str, Union[np.ndarray, List[np.ndarray]]]:
+             rdm1_eff: np.ndarray, pop: str, prop_type: Union[str, List[str]], part: str, ndo: bool, \
+             parallel: Union[bool, str], gauge_origin: np.ndarray, grid_blksize: Union[None, int] = None, \
+             n_workers: Union[None, int] = None, chkfile: str = '', auxbasis: Union[None, str] = None, \
+             frags: Union[None, List[List[int]]] = None, tag: str = '', \
+             **kwargs: Any) -> Dict[str, Union[np.ndarray, List[np.ndarray], Dict[str, Any]]]:
         """
         this function returns atom-decomposed mean-field properties
+        (or fragment-decomposed properties for given fragments, i.e., lists of atom indices)
+        (tag: suffix of the checkpoint stages of a given state)
+        (for a list of properties, all of these are evaluated in the same pass and a dict of results is returned per property)
         """
-        # declare nested kernel functions in global scope
-        global prop_atom
-        global prop_eda
-        global prop_orb
+        # properties
+        prop_types = [prop_type] if isinstance(prop_type, str) else list(prop_type)
+        energy, dipole = 'energy' in prop_types, 'dipole' in prop_types
 
         # dft logical
         dft_calc = isinstance(mf, dft.rks.KohnShamDFT)
 
         # ao dipole integrals with specified gauge origin
-        if prop_type == 'dipole':
-            with mol.with_common_origin(gauge_origin):
-                ao_dip = mol.intor_symmetric('int1e_r', comp=3)
+        if dipole:
+            with timing('integrals'), mol.with_common_origin(gauge_origin):
+                ao_dip = intor_symmetric(mol, 'int1e_r', comp=3)
         else:
             ao_dip = None
 
         # compute total 1-RDMs (AO basis)
-        if rdm1_eff is None:
-            rdm1_eff = np.array([make_rdm1(mo_coeff[0], mo_occ[0]), make_rdm1(mo_coeff[1], mo_occ[1])])
-        if rdm1_eff.ndim == 2:
-            rdm1_eff = np.array([rdm1_eff, rdm1_eff]) * .5
+        rdm1_eff = make_rdm1_eff(mo_coeff, mo_occ, rdm1_eff)
         rdm1_tot = np.array([make_rdm1(mo_coeff[0], mo_occ[0]), make_rdm1(mo_coeff[1], mo_occ[1])])
 
         # mol object projected into minao basis
@@ -63,258 +70,351 @@ def prop_tot(mol: gto.Mole, mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], \
         # effective atomic charges
         if 'weights' in kwargs:
             weights = kwargs['weights']
-            charge_atom = -np.sum(weights[0] + weights[1], axis=0)
+            if scipy.sparse.issparse(weights[0]):
+                charge_atom = -np.asarray(weights[0].sum(axis=0) + weights[1].sum(axis=0)).ravel()
+            else:
+                charge_atom = -(np.sum(weights[0], axis=0) + np.sum(weights[1], axis=0))
             if not ndo:
-                charge_atom += pmol.atom_charges()
+                charge_atom += frag_sum(pmol.atom_charges(), frags)
         else:
             charge_atom = 0.
 
+        # number of atoms (or fragments)
+        natm = pmol.natm if frags is None else len(frags)
+
         # possible mm region
         mm_mol = getattr(mf, 'mm_mol', None)
 
         # possible cosmo/pcm solvent model
-        if getattr(mf, 'with_solvent', None):
+        if energy and getattr(mf, 'with_solvent', None):
             e_solvent = _solvent(mol, np.sum(rdm1_eff, axis=0), mf.with_solvent)
         else:
             e_solvent = None
 
-        # nuclear repulsion property
-        if prop_type == 'energy':
-            prop_nuc_rep = _e_nuc(pmol, mm_mol)
-        elif prop_type == 'dipole':
-            prop_nuc_rep = _dip_nuc(pmol, charge_atom, gauge_origin)
-
-        # core hamiltonian
-        kin, nuc, sub_nuc, mm_pot = _h_core(mol, mm_mol)
-        # fock potential
-        vj, vk = mf.get_jk(mol=mol, dm=rdm1_eff)
-
-        # calculate xc energy density
-        if dft_calc:
-            # ndo assertion
-            if ndo:
-                raise NotImplementedError('NDOs for KS-DFT is not implemented')
-            # xc-type and ao_deriv
-            xc_type, ao_deriv = _xc_ao_deriv(mf.xc)
-            # update exchange operator wrt range-separated parameter and exact exchange components
-            vk = _vk_dft(mol, mf, mf.xc, rdm1_eff, vk)
-            # ao function values on given grid
-            ao_value = _ao_val(mol, mf.grids.coords, ao_deriv)
-            # grid weights
-            grid_weights = mf.grids.weights
-            # compute all intermediates
-            c0_tot, c1_tot, rho_tot = _make_rho(ao_value, rdm1_eff, xc_type)
-            # evaluate xc energy density
-            eps_xc = dft.libxc.eval_xc(mf.xc, rho_tot, spin=0 if isinstance(rho_tot, np.ndarray) else -1)[0]
-            # nlc (vv10)
-            if mf.nlc.upper() == 'VV10':
-                nlc_pars = dft.libxc.nlc_coeff(mf.xc)
-                ao_value_nlc = _ao_val(mol, mf.nlcgrids.coords, 1)
-                grid_weights_nlc = mf.nlcgrids.weights
-                c0_vv10, c1_vv10, rho_vv10 = _make_rho(ao_value_nlc, np.sum(rdm1_eff, axis=0), 'GGA')
-                eps_xc_nlc = numint._vv10nlc(rho_vv10, mf.nlcgrids.coords, rho_vv10, \
-                                             grid_weights_nlc, mf.nlcgrids.coords, nlc_pars)[0]
-            else:
-                eps_xc_nlc = None
+        # nuclear repulsion properties
+        prop_nuc_rep = {}
+        if energy:
+            prop_nuc_rep['energy'] = frag_sum(_e_nuc(pmol, mm_mol), frags)
+        if dipole:
+            prop_nuc_rep['dipole'] = _dip_nuc(pmol, charge_atom, gauge_origin, frags)
+
+        # ndo assertion
+        if dft_calc and ndo:
+            raise NotImplementedError('NDOs for KS-DFT is not implemented')
+
+        if energy:
+            # core hamiltonian
+            with timing('integrals'):
+                kin, nuc, mm_pot = _h_core(mol, mm_mol)
+            # fock potential (with exchange operator updated wrt range-separated parameter and exact exchange components)
+            with timing('jk'):
+                jk = stage(chkfile, 'jk' + tag, (mol, rdm1_eff, mf.__class__.__name__, getattr(mf, 'xc', None), \
+                                           getattr(getattr(mf, 'with_df', None), 'auxbasis', None), auxbasis), \
+                           lambda: _jk(mol, mf, rdm1_eff, dft_calc, auxbasis))
+            vj, vk = jk['vj'], jk['vk']
         else:
-            xc_type = ''
-            grid_weights = grid_weights_nlc = None
-            ao_value = ao_value_nlc = None
-            eps_xc = eps_xc_nlc = None
-            c0_tot = c1_tot = None
-            c0_vv10 = c1_vv10 = None
+            kin = nuc = mm_pot = vj = vk = None
 
         # molecular dimensions
         alpha, beta = dim(mo_occ)
 
-        # atomic labels
-        if part == 'eda':
-            ao_labels = mol.ao_labels(fmt=None)
-
-        def prop_atom(atom_idx: int) -> Dict[str, Any]:
-                """
-                this function returns atom-wise energy/dipole contributions
-                """
-                # init results
-                if prop_type == 'energy':
-                    res = {comp_key: 0. for comp_key in COMP_KEYS}
+        # contiguous AO ranges of individual atoms
+        ao_slices = mol.aoslice_by_atom()[:, 2:]
+
+        # number of workers
+        n_procs = split(parallel, n_workers)[0]
+
+        # calculate xc energy contributions
+        if 'xc' in kwargs:
+            xc = kwargs['xc']
+        elif energy and dft_calc:
+            xc = stage(chkfile, ('xc_eda' if part == 'eda' else 'xc_orbitals') + tag, \
+                       (mol, rdm1_eff, mo_coeff, mo_occ, mf.xc, mf.nlc, mf.grids.coords, mf.grids.weights), \
+                       lambda: {'xc': xc_tot(mol, mf, [mo_coeff], [mo_occ], [rdm1_eff], part, parallel, \
+                                             grid_blksize = grid_blksize, n_workers = n_workers, \
+                                             chkfile = chkfile, tag = tag)[0]})['xc']
+        else:
+            xc = None
+
+        # perform decomposition
+        with timing('partition'):
+            if part == 'eda':
+                # init atom-specific energy and/or dipole arrays
+                prop = _init_prop(prop_types, natm)
+                # global nuclear attraction from the electronic potential at the nuclei
+                if energy:
+                    nuc_att_glob = mol.atom_charges() * _nuc_pot(mol, np.sum(rdm1_tot, axis=0)) * .5
                 else:
-                    res = {'el': np.zeros(3, dtype=np.float64)}
-                # atom-specific rdm1
-                rdm1_atom = np.zeros_like(rdm1_tot)
+                    nuc_att_glob = None
+                # domain of atom ranges
+                domain = ranges(pmol.natm, n_procs)
+                # kernel data
+                data = {'prop_types': prop_types, 'ao_slices': ao_slices, 'rdm1_tot': rdm1_tot, \
+                        'vj': None if vj is None else np.sum(vj, axis=0), 'vk': vk, 'kin': kin, 'nuc': nuc, \
+                        'nuc_att_glob': nuc_att_glob, 'mm_pot': mm_pot, 'e_solvent': e_solvent, 'ao_dip': ao_dip}
+                # execute kernel (and sum up atom-wise contributions of fragments)
+                res = frag_sum(np.concatenate(execute(_prop_eda, domain, data, parallel, n_workers)), frags)
+                # collect results
+                if energy:
+                    for k, comp_key in enumerate(EDA_KEYS):
+                        prop['energy'][comp_key] = res[:, k]
+                    res = res[:, len(EDA_KEYS):]
+                    # sum up electronic contributions
+                    if xc is not None:
+                        prop['energy']['xc'] = frag_sum(xc, frags)
+                    for comp_key in COMP_KEYS[:-2]:
+                        prop['energy']['el'] += prop['energy'][comp_key]
+                if dipole:
+                    prop['dipole']['el'] = res
+                for prop_key in prop_types:
+                    if not ndo:
+                        prop[prop_key]['struct'] = prop_nuc_rep[prop_key]
+                    prop[prop_key]['charge_atom'] = charge_atom
+            else: # atoms or orbs
+                # init orbital-specific energy and/or dipole arrays
+                prop_orbs = {}
+                if energy:
+                    prop_orbs['energy'] = {comp_key: [np.zeros(alpha.size), np.zeros(beta.size)] for comp_key in COMP_KEYS[:-1]}
+                if dipole:
+                    prop_orbs['dipole'] = {comp_key: [np.zeros([alpha.size, 3], dtype=np.float64), np.zeros([beta.size, 3], dtype=np.float64)] for comp_key in COMP_KEYS}
                 # loop over spins
                 for i, spin_mo in enumerate((alpha, beta)):
-                    # loop over spin-orbitals
-                    for m, j in enumerate(spin_mo):
-                        # get orbital(s)
-                        orb = mo_coeff[i][:, j].reshape(mo_coeff[i].shape[0], -1)
-                        # orbital-specific rdm1
-                        rdm1_orb = make_rdm1(orb, mo_occ[i][j])
-                        # weighted contribution to rdm1_atom
-                        rdm1_atom[i] += rdm1_orb * weights[i][m][atom_idx] / np.sum(weights[i][m])
-                    # coulumb & exchange energy associated with given atom
-                    if prop_type == 'energy':
-                        res['coul'] += _trace(np.sum(vj, axis=0), rdm1_atom[i], scaling = .5)
-                        res['exch'] -= _trace(vk[i], rdm1_atom[i], scaling = .5)
-                # common energy contributions associated with given atom
-                if prop_type == 'energy':
-                    res['kin'] += _trace(kin, np.sum(rdm1_atom, axis=0))
-                    res['nuc_att_glob'] += _trace(sub_nuc[atom_idx], np.sum(rdm1_tot, axis=0), scaling = .5)
-                    res['nuc_att_loc'] += _trace(nuc, np.sum(rdm1_atom, axis=0), scaling = .5)
-                    if mm_pot is not None:
-                        res['solvent'] += _trace(mm_pot, np.sum(rdm1_atom, axis=0))
-                    if e_solvent is not None:
-                        res['solvent'] += e_solvent[atom_idx]
-                    # additional xc energy contribution
-                    if dft_calc:
-                        # atom-specific rho
-                        _, _, rho_atom = _make_rho(ao_value, np.sum(rdm1_atom, axis=0), xc_type)
-                        # energy from individual atoms
-                        res['xc'] += _e_xc(eps_xc, grid_weights, rho_atom)
-                        # nlc (vv10)
-                        if eps_xc_nlc is not None:
-                            _, _, rho_atom_vv10 = _make_rho(ao_value_nlc, np.sum(rdm1_atom, axis=0), 'GGA')
-                            res['xc'] += _e_xc(eps_xc_nlc, grid_weights_nlc, rho_atom_vv10)
-                elif prop_type == 'dipole':
-                    res['el'] -= _trace(ao_dip, np.sum(rdm1_atom, axis=0))
-                # sum up electronic contributions
-                if prop_type == 'energy':
-                    for comp_key in COMP_KEYS[:-2]:
-                        res['el'] += res[comp_key]
-                return res
-
-        def prop_eda(atom_idx: int) -> Dict[str, Any]:
-                """
-                this function returns EDA energy/dipole contributions
-                """
-                # init results
-                if prop_type == 'energy':
-                    res = {comp_key: 0. for comp_key in COMP_KEYS[:-1]}
-                else:
-                    res = {'el': np.zeros(3, dtype=np.float64)}
-                # get AOs on atom k
-                select = np.where([atom[0] == atom_idx for atom in ao_labels])[0]
-                # common energy contributions associated with given atom
-                if prop_type == 'energy':
+                    # occupied spin-orbitals and occupations
+                    mo = mo_coeff[i][:, spin_mo]
+                    mocc = mo_occ[i][spin_mo]
+                    # total energy and/or dipole moment associated with all spin-orbitals (MO basis)
+                    if energy:
+                        prop_orbs['energy']['coul'][i] = _trace_orbs(np.sum(vj, axis=0), mo, mocc, scaling = .5)
+                        prop_orbs['energy']['exch'][i] = -_trace_orbs(vk[i], mo, mocc, scaling = .5)
+                        prop_orbs['energy']['kin'][i] = _trace_orbs(kin, mo, mocc)
+                        prop_orbs['energy']['nuc_att'][i] = _trace_orbs(nuc, mo, mocc)
+                        if mm_pot is not None:
+                            prop_orbs['energy']['solvent'][i] = _trace_orbs(mm_pot, mo, mocc)
+                    if dipole:
+                        prop_orbs['dipole']['el'][i] = -_trace_orbs(ao_dip, mo, mocc)
+                # xc energy contributions
+                if xc is not None:
+                    prop_orbs['energy']['xc'] = [xc[:alpha.size], xc[alpha.size:]]
+                if part == 'atoms':
+                    # init atom-specific energy and/or dipole arrays
+                    prop = _init_prop(prop_types, natm)
                     # loop over spins
-                    for i, _ in enumerate((alpha, beta)):
-                        res['coul'] += _trace(np.sum(vj, axis=0)[select], rdm1_tot[i][select], scaling = .5)
-                        res['exch'] -= _trace(vk[i][select], rdm1_tot[i][select], scaling = .5)
-                    res['kin'] += _trace(kin[select], np.sum(rdm1_tot, axis=0)[select])
-                    res['nuc_att_glob'] += _trace(sub_nuc[atom_idx], np.sum(rdm1_tot, axis=0), scaling = .5)
-                    res['nuc_att_loc'] += _trace(nuc[select], np.sum(rdm1_tot, axis=0)[select], scaling = .5)
-                    if mm_pot is not None:
-                        res['solvent'] += _trace(mm_pot[select], np.sum(rdm1_tot, axis=0)[select])
-                    if e_solvent is not None:
-                        res['solvent'] += e_solvent[atom_idx]
-                    # additional xc energy contribution
-                    if dft_calc:
-                        # atom-specific rho
-                        rho_atom = _make_rho_interm2(c0_tot[:, select], \
-                                                     c1_tot if c1_tot is None else c1_tot[:, :, select], \
-                                                     ao_value[:, :, select], xc_type)
-                        # energy from individual atoms
-                        res['xc'] += _e_xc(eps_xc, grid_weights, rho_atom)
-                        # nlc (vv10)
-                        if eps_xc_nlc is not None:
-                            rho_atom_vv10 = _make_rho_interm2(c0_vv10[:, select], \
-                                                              c1_vv10 if c1_vv10 is None else c1_vv10[:, :, select], \
-                                                              ao_value_nlc[:, :, select], 'GGA')
-                            res['xc'] += _e_xc(eps_xc_nlc, grid_weights_nlc, rho_atom_vv10)
-                elif prop_type == 'dipole':
-                    res['el'] -= _trace(ao_dip[:, select], np.sum(rdm1_tot, axis=0)[select])
-                # sum up electronic contributions
-                if prop_type == 'energy':
-                    for comp_key in COMP_KEYS[:-2]:
-                        res['el'] += res[comp_key]
-                return res
-
-        def prop_orb(spin_idx: int, orb_idx: int) -> Dict[str, Any]:
-                """
-                this function returns bond-wise energy/dipole contributions
-                """
-                # init res
-                if prop_type == 'energy':
-                    res = {comp_key: 0. for comp_key in COMP_KEYS[:-1]}
+                    for i, spin_mo in enumerate((alpha, beta)):
+                        # normalized population weights (sparse weights only touch the significant orbital-atom pairs)
+                        if scipy.sparse.issparse(weights[i]):
+                            weights_norm = scipy.sparse.csr_matrix(weights[i].multiply(1. / weights[i].sum(axis=1)))
+                        else:
+                            weights_norm = np.asarray(weights[i], dtype=np.float64).reshape(spin_mo.size, natm)
+                            weights_norm = weights_norm / np.sum(weights_norm, axis=1)[:, None]
+                        # atom-wise contributions from weighted orbital-wise contributions
+                        if energy:
+                            for comp_key in ['coul', 'exch', 'kin', 'solvent', 'xc']:
+                                prop['energy'][comp_key] += weights_norm.T.dot(prop_orbs['energy'][comp_key][i])
+                            prop['energy']['nuc_att_loc'] += weights_norm.T.dot(prop_orbs['energy']['nuc_att'][i]) * .5
+                        if dipole:
+                            prop['dipole']['el'] += weights_norm.T.dot(prop_orbs['dipole']['el'][i])
+                    # contributions from the total 1-RDM
+                    if energy:
+                        prop['energy']['nuc_att_glob'] = frag_sum(mol.atom_charges() * _nuc_pot(mol, np.sum(rdm1_tot, axis=0)) * .5, frags)
+                        if e_solvent is not None:
+                            prop['energy']['solvent'] += frag_sum(e_solvent, frags)
+                        # sum up electronic contributions
+                        for comp_key in COMP_KEYS[:-2]:
+                            prop['energy']['el'] += prop['energy'][comp_key]
+                    for prop_key in prop_types:
+                        if not ndo:
+                            prop[prop_key]['struct'] = prop_nuc_rep[prop_key]
+                        prop[prop_key]['charge_atom'] = charge_atom
                 else:
-                    res = {}
-                # get orbital(s)
-                orb = mo_coeff[spin_idx][:, orb_idx].reshape(mo_coeff[spin_idx].shape[0], -1)
-                # orbital-specific rdm1
-                rdm1_orb = make_rdm1(orb, mo_occ[spin_idx][orb_idx])
-                # total energy or dipole moment associated with given spin-orbital
-                if prop_type == 'energy':
-                    res['coul'] += _trace(np.sum(vj, axis=0), rdm1_orb, scaling = .5)
-                    res['exch'] -= _trace(vk[spin_idx], rdm1_orb, scaling = .5)
-                    res['kin'] += _trace(kin, rdm1_orb)
-                    res['nuc_att'] += _trace(nuc, rdm1_orb)
-                    if mm_pot is not None:
-                        res['solvent'] += _trace(mm_pot, rdm1_orb)
-                    # additional xc energy contribution
-                    if dft_calc:
-                        # orbital-specific rho
-                        _, _, rho_orb = _make_rho(ao_value, rdm1_orb, xc_type)
-                        # xc energy from individual orbitals
-                        res['xc'] += _e_xc(eps_xc, grid_weights, rho_orb)
-                        # nlc (vv10)
-                        if eps_xc_nlc is not None:
-                            _, _, rho_orb_vv10 = _make_rho(ao_value_nlc, rdm1_orb, 'GGA')
-                            res['xc'] += _e_xc(eps_xc_nlc, grid_weights_nlc, rho_orb_vv10)
-                elif prop_type == 'dipole':
-                    res['el'] = -_trace(ao_dip, rdm1_orb)
-                # sum up electronic contributions
-                if prop_type == 'energy':
-                    for comp_key in COMP_KEYS[:-2]:
-                        res['el'] += res[comp_key]
-                return res
+                    # sum up electronic contributions
+                    if energy:
+                        for i in range(2):
+                            for comp_key in COMP_KEYS[:-2]:
+                                prop_orbs['energy']['el'][i] += prop_orbs['energy'][comp_key][i]
+                    # orbital symmetries
+                    orbsyms = orbsym(mol, mo_coeff)
+                    prop = {}
+                    for prop_key in prop_types:
+                        if ndo:
+                            prop_orbs[prop_key]['struct'] = np.zeros_like(prop_nuc_rep[prop_key])
+                        else:
+                            prop_orbs[prop_key]['struct'] = prop_nuc_rep[prop_key]
+                        prop[prop_key] = {**prop_orbs[prop_key], 'mo_occ': mo_occ, 'orbsym': orbsyms, 'ndo': ndo}
+
+        if isinstance(prop_type, str):
+            return prop[prop_type]
+        return prop
+
+
+def xc_tot(mol: gto.Mole, mf: dft.rks.KohnShamDFT, \
+           mo_coeff: List[Tuple[np.ndarray, np.ndarray]], mo_occ: List[Tuple[np.ndarray, np.ndarray]], \
+           rdm1_eff: List[np.ndarray], part: str, parallel: Union[bool, str], \
+           grid_blksize: Union[None, int] = None, n_workers: Union[None, int] = None, \
+           chkfile: str = '', tag: str = '') -> List[np.ndarray]:
+        """
+        this function returns atom- or orbital-wise xc energy contributions of one or more states of a molecule
+        (all states are evaluated in the same pass over the grid(s), such that ao values are only evaluated once per block)
+        (tag: suffix of the checkpoint stages)
+        """
+        # xc-type and ao_deriv
+        xc_type, ao_deriv = xc_ao_deriv(mf.xc)
+
+        # nlc (vv10) energy densities
+        if mf.nlc.upper() == 'VV10':
+            with timing('nlc'):
+                eps_xc_nlc = stage(chkfile, 'nlc' + tag, (mol, rdm1_eff, mf.xc, mf.nlcgrids.coords, mf.nlcgrids.weights), \
+                                   lambda: {'eps_xc_nlc': _eps_xc_nlc(mol, mf, rdm1_eff, grid_blksize)})['eps_xc_nlc']
+        else:
+            eps_xc_nlc = None
 
-        # perform decomposition
-        if part in ['atoms', 'eda']:
-            # init atom-specific energy or dipole arrays
-            if prop_type == 'energy':
-                prop = {comp_key: np.zeros(pmol.natm, dtype=np.float64) for comp_key in COMP_KEYS}
-            elif prop_type == 'dipole':
-                prop = {comp_key: np.zeros([pmol.natm, 3], dtype=np.float64) for comp_key in COMP_KEYS[-2:]}
-            # domain
-            domain = np.arange(pmol.natm)
-            # execute kernel
-            if multiproc:
-                n_threads = min(domain.size, lib.num_threads())
-                with mp.Pool(processes=n_threads) as pool:
-                    res = pool.map(prop_atom if part == 'atoms' else prop_eda, domain) # type:ignore
-            else:
-                res = list(map(prop_atom if part == 'atoms' else prop_eda, domain)) # type:ignore
-            # collect results
-            for k, r in enumerate(res):
-                for key, val in r.items():
-                    prop[key][k] = val
-            if not ndo:
-                prop['struct'] = prop_nuc_rep
-            return {**prop, 'charge_atom': charge_atom}
-        else: # orbs
-            # init orbital-specific energy or dipole array
-            if prop_type == 'energy':
-                prop = {comp_key: [np.zeros(alpha.size), np.zeros(beta.size)] for comp_key in COMP_KEYS[:-1]}
-            elif prop_type == 'dipole':
-                prop = {comp_key: [np.zeros([alpha.size, 3], dtype=np.float64), np.zeros([beta.size, 3], dtype=np.float64)] for comp_key in COMP_KEYS}
-            # domain
-            domain = np.array([(i, j) for i, orbs in enumerate((alpha, beta)) for j in orbs])
-            # execute kernel
-            if multiproc:
-                n_threads = min(domain.size, lib.num_threads())
-                with mp.Pool(processes=n_threads) as pool:
-                    res = pool.starmap(prop_orb, domain) # type:ignore
+        # molecular dimensions
+        dims = [dim(occ) for occ in mo_occ]
+
+        # number of workers
+        n_procs = split(parallel, n_workers)[0]
+
+        # block size
+        if grid_blksize is None:
+            blksize = -(-mf.grids.weights.size // n_procs)
+        else:
+            blksize = grid_blksize
+        # domain of grid blocks
+        domain = [(0, p0, p1) for p0, p1 in lib.prange(0, mf.grids.weights.size, blksize)]
+        if eps_xc_nlc is not None:
+            domain += [(1, p0, p1) for p0, p1 in lib.prange(0, mf.nlcgrids.weights.size, blksize)]
+        # kernel data
+        data = {'mol': mol, 'part': part, 'ao_slices': mol.aoslice_by_atom()[:, 2:], \
+                'xc': mf.xc, 'xc_type': xc_type, 'ao_deriv': ao_deriv, 'rdm1_eff': tuple(rdm1_eff), \
+                'mo': tuple(tuple(c[i][:, spin_mo] for i, spin_mo in enumerate(d)) for c, d in zip(mo_coeff, dims)), \
+                'mo_occ': tuple(tuple(occ[i][spin_mo] for i, spin_mo in enumerate(d)) for occ, d in zip(mo_occ, dims)), \
+                'grids_coords': mf.grids.coords, 'grids_weights': mf.grids.weights}
+        if eps_xc_nlc is not None:
+            data = {**data, 'nlcgrids_coords': mf.nlcgrids.coords, \
+                    'nlcgrids_weights': mf.nlcgrids.weights, 'eps_xc_nlc': tuple(eps_xc_nlc)}
+        # execute kernel and accumulate contributions from all grid blocks
+        with timing('xc'):
+            xc = np.sum(execute(_prop_xc, domain, data, parallel, n_workers), axis=0)
+
+        # split into states
+        if part == 'eda':
+            sizes = [mol.natm] * len(rdm1_eff)
+        else:
+            sizes = [d[0].size + d[1].size for d in dims]
+        return np.split(xc, np.cumsum(sizes)[:-1])
+
+
+def make_rdm1_eff(mo_coeff: Tuple[np.ndarray, np.ndarray], mo_occ: Tuple[np.ndarray, np.ndarray], \
+                  rdm1_eff: Union[None, np.ndarray]) -> np.ndarray:
+        """
+        this function returns the effective spin 1-RDMs (AO basis), either from given orbitals or a given 1-RDM
+        """
+        if rdm1_eff is None:
+            rdm1_eff = np.array([make_rdm1(mo_coeff[0], mo_occ[0]), make_rdm1(mo_coeff[1], mo_occ[1])])
+        if rdm1_eff.ndim == 2:
+            rdm1_eff = np.array([rdm1_eff, rdm1_eff]) * .5
+        return rdm1_eff
+
+
+def xc_ao_deriv(xc_func: str) -> Tuple[str, int]:
+        """
+        this function returns the type of xc functional and the level of ao derivatives needed
+        """
+        xc_type = dft.libxc.xc_type(xc_func)
+        if xc_type == 'LDA':
+            ao_deriv = 0
+        elif xc_type in ['GGA', 'NLC']:
+            ao_deriv = 1
+        elif xc_type == 'MGGA':
+            ao_deriv = 2
+        return xc_type, ao_deriv
+
+
+def _init_prop(prop_types: List[str], natm: int) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        this function returns initialized atom-specific arrays for all given properties
+        """
+        prop = {}
+        if 'energy' in prop_types:
+            prop['energy'] = {comp_key: np.zeros(natm, dtype=np.float64) for comp_key in COMP_KEYS}
+        if 'dipole' in prop_types:
+            prop['dipole'] = {comp_key: np.zeros([natm, 3], dtype=np.float64) for comp_key in COMP_KEYS[-2:]}
+        return prop
+
+
+def _prop_eda(data: Dict[str, Any], atom_start: int, atom_end: int) -> np.ndarray:
+        """
+        this function returns EDA energy and/or dipole contributions for a range of atoms
+        (energy components in the first len(EDA_KEYS) columns followed by the dipole components)
+        """
+        # contiguous AO range of given atoms (and AO ranges of individual atoms within it)
+        ao_slices = data['ao_slices'][atom_start:atom_end]
+        p0, p1 = ao_slices[0, 0], ao_slices[-1, 1]
+        ao_slices = ao_slices - p0
+        # row blocks (views) of total 1-RDM
+        rdm1_tot = tuple(rdm1[p0:p1] for rdm1 in data['rdm1_tot'])
+        rdm1_sum = rdm1_tot[0] + rdm1_tot[1]
+        # init results
+        res = []
+        # common energy contributions associated with given atoms
+        if 'energy' in data['prop_types']:
+            res_energy = np.zeros([atom_end - atom_start, len(EDA_KEYS)], dtype=np.float64)
+            # loop over spins
+            for i in range(2):
+                res_energy[:, 0] += _trace_atoms(data['vj'][p0:p1], rdm1_tot[i], ao_slices, scaling = .5)
+                res_energy[:, 1] -= _trace_atoms(data['vk'][i][p0:p1], rdm1_tot[i], ao_slices, scaling = .5)
+            res_energy[:, 2] += _trace_atoms(data['kin'][p0:p1], rdm1_sum, ao_slices)
+            if data['mm_pot'] is not None:
+                res_energy[:, 3] += _trace_atoms(data['mm_pot'][p0:p1], rdm1_sum, ao_slices)
+            if data['e_solvent'] is not None:
+                res_energy[:, 3] += data['e_solvent'][atom_start:atom_end]
+            res_energy[:, 4] += data['nuc_att_glob'][atom_start:atom_end]
+            res_energy[:, 5] += _trace_atoms(data['nuc'][p0:p1], rdm1_sum, ao_slices, scaling = .5)
+            res.append(res_energy)
+        # dipole contributions associated with given atoms
+        if 'dipole' in data['prop_types']:
+            res.append(-_trace_atoms(data['ao_dip'][:, p0:p1], rdm1_sum, ao_slices))
+        return np.concatenate(res, axis=1)
+
+
+def _prop_xc(data: Dict[str, Any], grid_idx: int, blk_start: int, blk_end: int) -> np.ndarray:
+        """
+        this function returns atom- or orbital-wise xc energy contributions of all states from a block of grid points
+        """
+        # grid, type of functional, and level of ao derivatives
+        if grid_idx == 0:
+            grids, xc_type, ao_deriv = 'grids', data['xc_type'], data['ao_deriv']
+        else:
+            grids, xc_type, ao_deriv = 'nlcgrids', 'GGA', 1
+        # grid weights in given block
+        grid_weights = data[grids + '_weights'][blk_start:blk_end]
+        # ao function values in given block (block-level stages are only recorded for serial execution)
+        with timing('grid'):
+            ao_value = _ao_val(data['mol'], data[grids + '_coords'][blk_start:blk_end], ao_deriv)
+        # init results
+        res = []
+        # loop over states
+        for k, rdm1_eff in enumerate(data['rdm1_eff']):
+            # xc energy density in given block
+            if grid_idx == 0:
+                c0_tot, _, rho_tot = _make_rho(ao_value, rdm1_eff, xc_type)
+                with timing('eval_xc'):
+                    eps_xc = dft.libxc.eval_xc(data['xc'], rho_tot, spin=0 if isinstance(rho_tot, np.ndarray) else -1)[0]
             else:
-                res = list(starmap(prop_orb, domain)) # type:ignore
-            # collect results
-            for k, r in enumerate(res):
-                for key, val in r.items():
-                    prop[key][domain[k, 0]][domain[k, 1]] = val
-            if ndo:
-                prop['struct'] = np.zeros_like(prop_nuc_rep)
+                if data['part'] == 'eda':
+                    c0_tot = _make_rho_interm1(ao_value, np.sum(rdm1_eff, axis=0), xc_type)[0]
+                eps_xc = data['eps_xc_nlc'][k][blk_start:blk_end]
+            if data['part'] == 'eda':
+                # rho[0] is a sum of AO-wise contributions, so xc energies of all atoms follow from one pass
+                ao_value_0 = ao_value if ao_value.ndim == 2 else ao_value[0]
+                res.append(_sum_atoms(contract('p,p,pi,pi->i', eps_xc, grid_weights, ao_value_0, c0_tot), data['ao_slices']))
             else:
-                prop['struct'] = prop_nuc_rep
-            return {**prop, 'mo_occ': mo_occ, 'orbsym': orbsym(mol, mo_coeff), 'ndo': ndo}
+                # loop over spins
+                for i in range(2):
+                    # densities of all spin-orbitals in given block
+                    rho_orbs = _make_rho_orbs(ao_value, data['mo'][k][i], data['mo_occ'][k][i], xc_type)
+                    # xc energy from individual orbitals
+                    res.append(contract('p,p,pi->i', eps_xc, grid_weights, rho_orbs))
+        return np.concatenate(res)
 
 
 def _e_nuc(mol: gto.Mole, mm_mol: Union[None, gto.Mole]) -> np.ndarray:
@@ -339,40 +439,62 @@ def _e_nuc(mol: gto.Mole, mm_mol: Union[None, gto.Mole]) -> np.ndarray:
         return e_nuc
 
 
-def _dip_nuc(mol: gto.Mole, atom_charges: np.ndarray, gauge_origin: np.ndarray) -> np.ndarray:
+def _dip_nuc(mol: gto.Mole, atom_charges: np.ndarray, gauge_origin: np.ndarray, \
+             frags: Union[None, List[List[int]]] = None) -> np.ndarray:
         """
         this function returns the nuclear contribution to the molecular dipole moment
+        (atom_charges are fragment charges for given fragments)
         """
         # coordinates and formal/actual charges of nuclei
         coords = mol.atom_coords()
         form_charges = mol.atom_charges()
-        act_charges = form_charges - atom_charges
-        return contract('i,ix->ix', form_charges, coords) - contract('i,x->ix', act_charges, gauge_origin)
+        act_charges = frag_sum(form_charges, frags) - atom_charges
+        return frag_sum(contract('i,ix->ix', form_charges, coords), frags) - contract('i,x->ix', act_charges, gauge_origin)
 
 
 def _h_core(mol: gto.Mole, mm_mol: Union[None, gto.Mole]) -> Tuple[np.ndarray, np.ndarray, \
-                                                                   np.ndarray, Union[None, np.ndarray]]:
+                                                                   Union[None, np.ndarray]]:
         """
         this function returns the components of the core hamiltonian
         """
         # kinetic integrals
-        kin = mol.intor_symmetric('int1e_kin')
-        # coordinates and charges of nuclei
-        coords = mol.atom_coords()
-        charges = mol.atom_charges()
-        # individual atomic potentials
-        sub_nuc = np.zeros([mol.natm, mol.nao_nr(), mol.nao_nr()], dtype=np.float64)
-        for k in range(mol.natm):
-            with mol.with_rinv_origin(coords[k]):
-                sub_nuc[k] = -mol.intor('int1e_rinv') * charges[k]
+        kin = intor_symmetric(mol, 'int1e_kin')
         # total nuclear potential
-        nuc = np.sum(sub_nuc, axis=0)
+        nuc = intor_symmetric(mol, 'int1e_nuc')
         # possible mm potential
         if mm_mol is not None:
-            mm_pot = _mm_pot(mol, mm_mol)
+            mm_pot = cached(('mm_pot', mol_key(mol), mm_mol.atom_coords().tobytes(), \
+                             mm_mol.atom_charges().tobytes()), lambda: _mm_pot(mol, mm_mol))
         else:
             mm_pot = None
-        return kin, nuc, sub_nuc, mm_pot
+        return kin, nuc, mm_pot
+
+
+def _nuc_pot(mol: gto.Mole, rdm1: np.ndarray) -> np.ndarray:
+        """
+        this function returns the electrostatic potential of the electrons at the positions of the nuclei
+        (batched evaluation over blocks of nuclei, which keeps memory at O(nao^2) irrespective of the number of atoms)
+        """
+        # settings
+        coords = mol.atom_coords()
+        nao = mol.nao_nr()
+        npair = nao * (nao + 1) // 2
+        # number of nuclei per block such that 3-center integrals never exceed the size of a few nao x nao matrices
+        blksize = max(1, min(BLKSIZE, 8 * nao ** 2 // npair))
+        # integrals
+        intor = 'int3c2e_cart' if mol.cart else 'int3c2e_sph'
+        cintopt = gto.moleintor.make_cintopt(mol._atm, mol._bas,
+                                             mol._env, intor)
+        # lower-triangular 1-RDM (with doubled off-diagonal elements)
+        rdm1_tril = lib.pack_tril(rdm1 + rdm1.T - np.diag(np.diag(rdm1)))
+        # compute potential
+        nuc_pot = np.zeros(mol.natm, dtype=np.float64)
+        for i0, i1 in lib.prange(0, mol.natm, blksize):
+            fakemol = gto.fakemol_for_charges(coords[i0:i1])
+            j3c = df.incore.aux_e2(mol, fakemol, intor=intor,
+                                   aosym='s2ij', cintopt=cintopt)
+            nuc_pot[i0:i1] = -np.einsum('xk,x->k', j3c, rdm1_tril)
+        return nuc_pot
 
 
 def _mm_pot(mol: gto.Mole, mm_mol: gto.Mole) -> np.ndarray:
@@ -400,11 +522,13 @@ def _mm_pot(mol: gto.Mole, mm_mol: gto.Mole) -> np.ndarray:
 
 
 def _solvent(mol: gto.Mole, rdm1: np.ndarray, \
-             solvent_model: solvent.ddcosmo.DDCOSMO) -> np.ndarray:
+             solvent_model: 'solvent.ddcosmo.DDCOSMO') -> np.ndarray:
         """
         this function return atom-specific PCM/COSMO contributions
         (adapted from: solvent/ddcosmo.py:_get_vind() in PySCF)
         """
+        # pyscf.solvent is slow to import and only needed for solvated mean-field objects
+        from pyscf import solvent
         # settings
         r_vdw      = solvent_model._intermediates['r_vdw'     ]
         ylm_1sph   = solvent_model._intermediates['ylm_1sph'  ]
@@ -422,20 +546,6 @@ def _solvent(mol: gto.Mole, rdm1: np.ndarray, \
         return .5 * f_epsilon * np.einsum('jx,jx->j', psi, Xvec)
 
 
-def _xc_ao_deriv(xc_func: str) -> Tuple[str, int]:
-        """
-        this function returns the type of xc functional and the level of ao derivatives needed
-        """
-        xc_type = dft.libxc.xc_type(xc_func)
-        if xc_type == 'LDA':
-            ao_deriv = 0
-        elif xc_type in ['GGA', 'NLC']:
-            ao_deriv = 1
-        elif xc_type == 'MGGA':
-            ao_deriv = 2
-        return xc_type, ao_deriv
-
-
 def _make_rho_interm1(ao_value: np.ndarray, \
                       rdm1: np.ndarray, xc_type: str) -> Tuple[np.ndarray, Union[None, np.ndarray]]:
         """
@@ -525,8 +635,72 @@ def _make_rho(ao_value: np.ndarray, rdm1: np.ndarray, \
         return c0, c1, rho
 
 
+def _make_rho_orbs(ao_value: np.ndarray, mo: np.ndarray, \
+                   mo_occ: np.ndarray, xc_type: str) -> np.ndarray:
+        """
+        this function returns the densities of all given spin-orbitals on a grid
+        (the MOs are evaluated on the grid once such that each density follows from an elementwise product)
+        """
+        # mo function values on given grid
+        if xc_type.upper() in ['LDA', 'HF']:
+            mo_value = contract('pk,ki->pi', ao_value, mo)
+        else:
+            mo_value = contract('pk,ki->pi', ao_value[0], mo)
+        return mo_value ** 2 * mo_occ
+
+
+def _make_rho_blks(mol: gto.Mole, grids_coords: np.ndarray, rdm1: List[np.ndarray], \
+                   xc_type: str, ao_deriv: int, blksize: Union[None, int]) -> List[np.ndarray]:
+        """
+        this function returns rho of one or more 1-RDMs on the given grid, evaluated block by block
+        """
+        # block size
+        if blksize is None:
+            blksize = grids_coords.shape[0]
+        # loop over blocks of grid points
+        rho: List[List[np.ndarray]] = [[] for _ in rdm1]
+        for p0, p1 in lib.prange(0, grids_coords.shape[0], blksize):
+            # ao function values in given block
+            ao_value = _ao_val(mol, grids_coords[p0:p1], ao_deriv)
+            for k, rdm1_state in enumerate(rdm1):
+                rho[k].append(_make_rho(ao_value, rdm1_state, xc_type)[2])
+        return [np.concatenate(rho_state, axis=-1) for rho_state in rho]
+
+
+def _jk(mol: gto.Mole, mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], \
+        rdm1: np.ndarray, dft_calc: bool, auxbasis: Union[None, str] = None) -> Dict[str, np.ndarray]:
+        """
+        this function returns the coulomb and (dft-updated) exchange operators
+        (either from the mean-field object or, for a given auxiliary basis, by density fitting irrespective of the scf)
+        """
+        if auxbasis is None:
+            get_jk = None
+            vj, vk = mf.get_jk(mol=mol, dm=rdm1)
+        else:
+            with_df = df.DF(mol, auxbasis=auxbasis)
+            get_jk = lambda mol, dm, with_j=True, omega=None: with_df.get_jk(dm, hermi=1, with_j=with_j, omega=omega)
+            vj, vk = get_jk(mol, rdm1)
+        if dft_calc:
+            vk = _vk_dft(mol, mf, mf.xc, rdm1, vk, get_jk)
+        return {'vj': vj, 'vk': vk}
+
+
+def _eps_xc_nlc(mol: gto.Mole, mf: dft.rks.KohnShamDFT, \
+                rdm1: List[np.ndarray], grid_blksize: Union[None, int]) -> List[np.ndarray]:
+        """
+        this function returns the nlc (vv10) energy densities of one or more states on the nlc grid
+        """
+        nlc_pars = dft.libxc.nlc_coeff(mf.xc)
+        # rho on the nlc grid (evaluated block by block)
+        rho_vv10 = _make_rho_blks(mol, mf.nlcgrids.coords, [np.sum(rdm1_state, axis=0) for rdm1_state in rdm1], \
+                                  'GGA', 1, grid_blksize)
+        return [numint._vv10nlc(rho, mf.nlcgrids.coords, rho, \
+                                mf.nlcgrids.weights, mf.nlcgrids.coords, nlc_pars)[0] for rho in rho_vv10]
+
+
 def _vk_dft(mol: gto.Mole, mf: dft.rks.KohnShamDFT, \
-            xc_func: str, rdm1: np.ndarray, vk: np.ndarray) -> np.ndarray:
+            xc_func: str, rdm1: np.ndarray, vk: np.ndarray, \
+            get_jk: Union[None, Callable[..., Tuple[np.ndarray, np.ndarray]]] = None) -> np.ndarray:
         """
         this function returns the appropriate dft exchange operator
         """
@@ -536,7 +710,10 @@ def _vk_dft(mol: gto.Mole, mf: dft.rks.KohnShamDFT, \
         vk *= ks_hyb
         # range separated coulomb operator
         if abs(ks_omega) > 1e-10:
-            vk_lr = mf.get_k(mol, rdm1, omega=ks_omega)
+            if get_jk is None:
+                vk_lr = mf.get_k(mol, rdm1, omega=ks_omega)
+            else:
+                vk_lr = get_jk(mol, rdm1, with_j=False, omega=ks_omega)[1]
             vk_lr *= (ks_alpha - ks_hyb)
             vk += vk_lr
         return vk
@@ -559,6 +736,39 @@ def _trace(op: np.ndarray, rdm1: np.ndarray, scaling: float = 1.) -> Union[float
             return contract('xij,ij->x', op, rdm1) * scaling
 
 
+def _trace_atoms(op: np.ndarray, rdm1: np.ndarray, ao_slices: np.ndarray, scaling: float = 1.) -> np.ndarray:
+        """
+        this function returns the traces between row blocks of an operator and an rdm1 for all atoms
+        """
+        if op.ndim == 2:
+            rows = contract('ij,ij->i', op, rdm1)
+        else:
+            rows = contract('xij,ij->ix', op, rdm1)
+        return _sum_atoms(rows, ao_slices) * scaling
+
+
+def _sum_atoms(rows: np.ndarray, ao_slices: np.ndarray) -> np.ndarray:
+        """
+        this function returns sums of AO-wise contributions over the contiguous AO ranges of all atoms
+        """
+        # pad with a zero row such that the start of an atom without AOs is always a valid index
+        rows = np.concatenate((rows, np.zeros((1,) + rows.shape[1:], dtype=rows.dtype)))
+        res = np.add.reduceat(rows, ao_slices[:, 0], axis=0)
+        res[ao_slices[:, 0] == ao_slices[:, 1]] = 0.
+        return res
+
+
+def _trace_orbs(op: np.ndarray, mo: np.ndarray, mo_occ: np.ndarray, scaling: float = 1.) -> np.ndarray:
+        """
+        this function returns the traces between an operator and the 1-RDMs of all given spin-orbitals
+        (the operator is transformed into the MO basis once and the traces are read off its diagonal)
+        """
+        if op.ndim == 2:
+            return contract('pi,pq,qi->i', mo, op, mo) * mo_occ * scaling
+        else:
+            return contract('pi,xpq,qi->ix', mo, op, mo) * mo_occ[:, None] * scaling
+
+
 def _e_xc(eps_xc: np.ndarray, grid_weights: np.ndarray, rho: np.ndarray) -> float:
         """
         this function returns a contribution to the exchange-correlation energy from given rmd1 (via rho)
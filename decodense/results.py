@@ -12,7 +12,6 @@ __status__ = 'Development'
 
 import os
 import numpy as np
-import pandas as pd
 from pyscf import gto, lo
 from typing import Dict, Tuple, List, Union, Any
 
@@ -53,7 +52,9 @@ def info(decomp: DecompCls, mol: Union[None, gto.Mole] = None, **kwargs: float)
         string += ' partitioning       =  {:}\n'
         string += ' assignment         =  {:}\n'
         string += ' localization       =  {:}\n'
-        form += (decomp.prop, decomp.part, decomp.pop, _format(decomp.loc),)
+        form += (decomp.prop if isinstance(decomp.prop, str) else ', '.join(decomp.prop), \
+                 decomp.part if decomp.frags is None else '{:} ({:d} fragments)'.format(decomp.part, len(decomp.frags)), \
+                 decomp.pop, _format(decomp.loc),)
         if mol is not None:
             string += '\n point group        =  {:}\n'
             string += ' electrons          =  {:d}\n'
@@ -73,24 +74,30 @@ def info(decomp: DecompCls, mol: Union[None, gto.Mole] = None, **kwargs: float)
         return string.format(*form)
 
 
-def results(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
+def results(mol: gto.Mole, header: str, frags: Union[None, List[List[int]]] = None, **kwargs: np.ndarray) -> str:
         """
-        this function prints the results based on either an atom- or bond-based partitioning
+        this function prints the results based on either an atom- (or fragment-) or bond-based partitioning
         """
         pmol = lo.iao.reference_mol(mol)
         if 'charge_atom' in kwargs:
-            return atoms(pmol, header, **kwargs)
+            return atoms(pmol, header, frags=frags, **kwargs)
         else:
             return orbs(pmol, header, **kwargs)
 
 
-def atoms(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
+def atoms(mol: gto.Mole, header: str, frags: Union[None, List[List[int]]] = None, **kwargs: np.ndarray) -> str:
         """
-        atom-based partitioning
+        atom-based (or fragment-based) partitioning
         """
         # init string
         string: str = ''
 
+        # row labels
+        if frags is None:
+            unit_name, labels = 'atom', [f'{mol.atom_symbol(i)}{i}' for i in range(mol.natm)]
+        else:
+            unit_name, labels = 'frag', [f'F{i}' for i in range(len(frags))]
+
         # property type
         scalar_prop = kwargs['el'].ndim == 1
         # property contributions
@@ -107,6 +114,7 @@ def atoms(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
         # dump dict as dataframe
         if 'dump_res' in kwargs:
             if kwargs['dump_res']:
+                import pandas as pd
                 df = pd.DataFrame.from_dict(prop)
                 suffix = '' if 'suffix' not in kwargs else kwargs['suffix']
                 df.to_csv(f'res{suffix:}.csv', index=False)
@@ -140,26 +148,26 @@ def atoms(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
             string += f'{f"{header} (unit: {unit})":^{length}}\n'
             string += divider
             string += divider
-            string += f'{"atom":^6}|{"coulomb":^15}|{"exchange":^15}|{"kinetic":^15}|'
+            string += f'{unit_name:^6}|{"coulomb":^15}|{"exchange":^15}|{"kinetic":^15}|'
             string += f'{"nuc. att. (G)":^15}|{"nuc. att. (L)":^15}|{"solvent":^15}|{"xc":^15}||'
             string += f'{"electronic":^15}||{"structural":^15}|||{"total":^15}|||{"part. charge":^16}\n'
             string += divider
             string += divider
 
             # individual contributions
-            for i in range(mol.natm):
-                string += f' {f"{mol.atom_symbol(i)}{i}":<5s}|' \
-                          f'{prop["coul"][i] * scaling:>13.5f}  |' \
-                          f'{prop["exch"][i] * scaling:>13.5f}  |' \
-                          f'{prop["kin"][i] * scaling:>13.5f}  |' \
-                          f'{prop["nuc_att_glob"][i] * scaling:>13.5f}  |' \
-                          f'{prop["nuc_att_loc"][i] * scaling:>13.5f}  |' \
-                          f'{prop["solvent"][i] * scaling:>13.5f}  |' \
-                          f'{prop["xc"][i] * scaling:>13.5f}  ||' \
-                          f'{prop["el"][i] * scaling:>13.5f}  ||' \
-                          f'{prop["struct"][i] * scaling:>13.5f}  |||' \
-                          f'{prop["tot"][i] * scaling:>13.5f}  |||' \
-                          f'{prop["charge_atom"][i]:>11.3f}\n'
+            string += ''.join(f' {label:<5s}|' \
+                              f'{prop["coul"][i] * scaling:>13.5f}  |' \
+                              f'{prop["exch"][i] * scaling:>13.5f}  |' \
+                              f'{prop["kin"][i] * scaling:>13.5f}  |' \
+                              f'{prop["nuc_att_glob"][i] * scaling:>13.5f}  |' \
+                              f'{prop["nuc_att_loc"][i] * scaling:>13.5f}  |' \
+                              f'{prop["solvent"][i] * scaling:>13.5f}  |' \
+                              f'{prop["xc"][i] * scaling:>13.5f}  ||' \
+                              f'{prop["el"][i] * scaling:>13.5f}  ||' \
+                              f'{prop["struct"][i] * scaling:>13.5f}  |||' \
+                              f'{prop["tot"][i] * scaling:>13.5f}  |||' \
+                              f'{prop["charge_atom"][i]:>11.3f}\n'
+                              for i, label in enumerate(labels))
             string += divider
             string += divider
 
@@ -203,7 +211,7 @@ def atoms(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
             string += f'{f"{header} (unit: {unit})":^{length}}\n'
             string += divider
             string += f'      |{"electronic":^35}|{"structural":^35}|{"total":^35}|\n'
-            string += f'{"atom":^6}|' + divider_2 + '|' + divider_2 + '|' + divider_2 + f'|{"part. charge":^16}\n'
+            string += f'{unit_name:^6}|' + divider_2 + '|' + divider_2 + '|' + divider_2 + f'|{"part. charge":^16}\n'
             string += '      |' \
                       f'{"x":^11}/{"y":^11}/{"z":^11}|' \
                       f'{"x":^11}/{"y":^11}/{"z":^11}|' \
@@ -212,18 +220,18 @@ def atoms(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
             string += divider
 
             # individual contributions
-            for i in range(mol.natm):
-                string += f' {f"{mol.atom_symbol(i)}{i}":<5s}|' \
-                          f' {prop["el-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["el-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["el-z"][i] * scaling + TOLERANCE:>8.3f}  |' \
-                          f' {prop["struct-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["struct-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["struct-z"][i] * scaling + TOLERANCE:>8.3f}  |' \
-                          f' {prop["tot-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["tot-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["tot-z"][i] * scaling + TOLERANCE:>8.3f}  |' \
-                          f'{prop["charge_atom"][i]:>+11.3f}\n'
+            string += ''.join(f' {label:<5s}|' \
+                              f' {prop["el-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["el-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["el-z"][i] * scaling + TOLERANCE:>8.3f}  |' \
+                              f' {prop["struct-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["struct-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["struct-z"][i] * scaling + TOLERANCE:>8.3f}  |' \
+                              f' {prop["tot-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["tot-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["tot-z"][i] * scaling + TOLERANCE:>8.3f}  |' \
+                              f'{prop["charge_atom"][i]:>+11.3f}\n'
+                              for i, label in enumerate(labels))
             string += divider
             string += divider
 
@@ -280,6 +288,7 @@ def orbs(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
         # dump dict as dataframe
         if 'dump_res' in kwargs:
             if kwargs['dump_res']:
+                import pandas as pd
                 df = pd.DataFrame.from_dict(prop)
                 suffix = '' if 'suffix' not in kwargs else kwargs['suffix']
                 df.to_csv(f'res{suffix:}.csv', index=False)
@@ -319,17 +328,17 @@ def orbs(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
             string += divider
 
             # individual contributions
-            for i in range(mo_idx.size):
-                string += f'  {i:>3d}     |' \
-                          f'{prop["coul"][i] * scaling:>12.5f}   |' \
-                          f'{prop["exch"][i] * scaling:>12.5f}   |' \
-                          f'{prop["kin"][i] * scaling:>12.5f}   |' \
-                          f'{prop["nuc_att"][i] * scaling:>12.5f}   |' \
-                          f'{prop["solvent"][i] * scaling:>12.5f}   |' \
-                          f'{prop["xc"][i] * scaling:>12.5f}   ||' \
-                          f'{prop["el"][i] * scaling:>12.5f}   ||' \
-                          f'{prop["mo_occ"][i]:>12.2e}   ||' \
-                          f'{prop["orbsym"][i]:^15}\n'
+            string += ''.join(f'  {i:>3d}     |' \
+                              f'{prop["coul"][i] * scaling:>12.5f}   |' \
+                              f'{prop["exch"][i] * scaling:>12.5f}   |' \
+                              f'{prop["kin"][i] * scaling:>12.5f}   |' \
+                              f'{prop["nuc_att"][i] * scaling:>12.5f}   |' \
+                              f'{prop["solvent"][i] * scaling:>12.5f}   |' \
+                              f'{prop["xc"][i] * scaling:>12.5f}   ||' \
+                              f'{prop["el"][i] * scaling:>12.5f}   ||' \
+                              f'{prop["mo_occ"][i]:>12.2e}   ||' \
+                              f'{prop["orbsym"][i]:^15}\n'
+                              for i in range(mo_idx.size))
 
             # summed contributions
             string += divider
@@ -386,13 +395,13 @@ def orbs(mol: gto.Mole, header: str, **kwargs: np.ndarray) -> str:
             string += divider
 
             # individual contributions
-            for i in range(mo_idx.size):
-                string += f'   {i:>2d}     |' \
-                          f' {prop["el-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["el-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
-                          f' {prop["el-z"][i] * scaling + TOLERANCE:>8.3f}  ||' \
-                          f'{prop["mo_occ"][i]:>12.2e}   ||' \
-                          f'{prop["orbsym"][i]:^15}\n'
+            string += ''.join(f'   {i:>2d}     |' \
+                              f' {prop["el-x"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["el-y"][i] * scaling + TOLERANCE:>8.3f}  /' \
+                              f' {prop["el-z"][i] * scaling + TOLERANCE:>8.3f}  ||' \
+                              f'{prop["mo_occ"][i]:>12.2e}   ||' \
+                              f'{prop["orbsym"][i]:^15}\n'
+                              for i in range(mo_idx.size))
 
             # summed contributions
             string += divider
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+timings module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import os
+import sys
+import threading
+import contextlib
+from time import perf_counter, process_time
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+from collections import OrderedDict
+from pyscf import lib
+from typing import List, Iterator, Any
+
+# stack of active timings (the innermost of which records all stages)
+ACTIVE: List['Timings'] = []
+
+
+class Timings(object):
+        """
+        this class records wall time, cpu time, and memory of the individual stages of a decomposition.
+        only stages entered by the thread (and process) that created the timings are recorded, stages entered
+        by parallel workers are covered by the enclosing stage of the parent
+        """
+        def __init__(self) -> None:
+            """
+            init Timings
+            """
+            self.stages: OrderedDict = OrderedDict()
+            self.level = 0
+            self.owner = (os.getpid(), threading.get_ident())
+
+        @contextlib.contextmanager
+        def stage(self, name: str) -> Iterator[None]:
+            """
+            this function records a stage (repeated stages are accumulated). besides the resident memory at
+            the end of the stage, the increase of the peak resident memory of the process during the stage is recorded
+            """
+            entry = self.stages.setdefault(name, {'level': self.level, 'calls': 0, 'wall': 0., 'cpu': 0., \
+                                                  'mem': 0., 'peak_mem': 0.})
+            wall, cpu, peak_mem = perf_counter(), process_time(), peak_memory()
+            self.level += 1
+            try:
+                yield
+            finally:
+                self.level -= 1
+                entry['calls'] += 1
+                entry['wall'] += perf_counter() - wall
+                entry['cpu'] += process_time() - cpu
+                entry['mem'] = max(entry['mem'], lib.current_memory()[0])
+                entry['peak_mem'] = max(entry['peak_mem'], peak_memory() - peak_mem)
+
+        def __enter__(self) -> 'Timings':
+            """
+            enter context (activate timings)
+            """
+            ACTIVE.append(self)
+            return self
+
+        def __exit__(self, *args: Any) -> None:
+            """
+            exit context (deactivate timings)
+            """
+            ACTIVE.remove(self)
+
+        def table(self) -> str:
+            """
+            this function returns a table of all recorded stages
+            (cpu times are summed over all threads of the process, memory in MB, peak+ is the increase of the peak
+            memory of the process during a stage)
+            """
+            string = '\n *** timings: ***\n'
+            string += ' {:<26s}{:>7s}{:>12s}{:>12s}{:>12s}{:>12s}\n'.format('stage', 'calls', 'wall (s)', 'cpu (s)', \
+                                                                         'rss (MB)', 'peak+ (MB)')
+            for name, entry in self.stages.items():
+                string += ' {:<26s}{:>7d}{:>12.3f}{:>12.3f}{:>12.1f}{:>12.1f}\n'.format('  ' * entry['level'] + name, \
+                                                                                     entry['calls'], entry['wall'], \
+                                                                                     entry['cpu'], entry['mem'], \
+                                                                                     entry['peak_mem'])
+            return string
+
+
+def timing(name: str) -> Any:
+        """
+        this function returns a context recording a stage in the active timings (if any, and if owned by the
+        calling thread, i.e., not for parallel workers)
+        """
+        if ACTIVE and ACTIVE[-1].owner == (os.getpid(), threading.get_ident()):
+            return ACTIVE[-1].stage(name)
+        return contextlib.nullcontext()
+
+
+def peak_memory() -> float:
+        """
+        this function returns the peak resident memory (in MB) of the process
+        """
+        if not RESOURCE_AVAILABLE:
+            return 0.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is given in bytes on macos and in kibibytes elsewhere
+        return peak / 1.e6 if sys.platform == 'darwin' else peak * 1024 / 1.e6
@@ -13,16 +13,18 @@ __status__ = 'Development'
 import sys
 import os
 import copy
+import functools
+import importlib.util
 import numpy as np
-try:
-    import opt_einsum as oe
-    OE_AVAILABLE = True
-except ImportError:
-    OE_AVAILABLE = False
+import scipy.sparse
 from subprocess import Popen, PIPE
 from pyscf import gto, scf, dft, symm, lib
-from pyscf import tools as pyscf_tools
-from typing import Tuple, List, Dict, Union
+from typing import Tuple, List, Dict, Union, Any
+
+from .integrals import intor_symmetric
+
+# opt_einsum is imported on first use
+OE_AVAILABLE = importlib.util.find_spec('opt_einsum') is not None
 
 MAX_CYCLE = 100
 NATORB_THRES = 1.e-12
@@ -54,9 +56,11 @@ class Logger(object):
             pass
 
 
+@functools.lru_cache(maxsize=None)
 def git_version() -> str:
         """
         this function returns the git revision as a string
+        (resolved on first call and cached)
         """
         def _minimal_ext_cmd(cmd):
             env = {}
@@ -157,7 +161,7 @@ def make_natorb(mol: gto.Mole, mo_coeff: np.ndarray, \
         else:
             d = rdm1
         # overlap matrix
-        s = mol.intor_symmetric('int1e_ovlp')
+        s = intor_symmetric(mol, 'int1e_ovlp')
         # ao to mo transformation of dm
         rdm1_mo = contract('xpi,pq,xqr,rs,xsj->xij', c, s, d, s, c)
         # diagonalize rdm1_mo
@@ -171,10 +175,11 @@ def make_natorb(mol: gto.Mole, mo_coeff: np.ndarray, \
 
 def write_rdm1(mol: gto.Mole, part: str, \
                mo_coeff: np.ndarray, mo_occ: np.ndarray, fmt: str, \
-               weights: List[np.ndarray], \
-               suffix: str = '') -> None:
+               weights: List[Union[np.ndarray, scipy.sparse.spmatrix]], \
+               suffix: str = '', frags: Union[None, List[List[int]]] = None) -> None:
         """
         this function writes a 1-RDM as a numpy or cube (default) file
+        (per atom or, for given fragments, per fragment)
         """
         # assertion
         assert part == 'atoms', '`write_rdm1` function only implemented for `atoms` partitioning'
@@ -183,27 +188,49 @@ def write_rdm1(mol: gto.Mole, part: str, \
         alpha, beta = dim(mo_occ)
         # compute total 1-RDM (AO basis)
         rdm1_tot = np.array([make_rdm1(mo_coeff[0], mo_occ[0]), make_rdm1(mo_coeff[1], mo_occ[1])])
-        # loop over atoms
-        for a in range(mol.natm):
+        # atom-major weights (sparse weights only hold the significant spin-orbitals of every atom)
+        weights_atom = [scipy.sparse.csc_matrix(w) if scipy.sparse.issparse(w) else np.asarray(w) for w in weights]
+        # loop over atoms (or fragments)
+        for a in range(mol.natm if frags is None else len(frags)):
             # atom-specific rdm1
             rdm1_atom = np.zeros_like(rdm1_tot)
             # loop over spins
             for i, spin_mo in enumerate((alpha, beta)):
+                # contributing spin-orbitals
+                if scipy.sparse.issparse(weights_atom[i]):
+                    col = weights_atom[i][:, a]
+                    orbs, w_orbs = col.indices, col.data
+                else:
+                    orbs, w_orbs = range(spin_mo.size), weights_atom[i][:, a]
                 # loop over spin-orbitals
-                for m, j in enumerate(spin_mo):
+                for m, w in zip(orbs, w_orbs):
                     # get orbital(s)
-                    orb = mo_coeff[i][:, j].reshape(mo_coeff[i].shape[0], -1)
+                    orb = mo_coeff[i][:, spin_mo[m]].reshape(mo_coeff[i].shape[0], -1)
                     # orbital-specific rdm1
-                    rdm1_orb = make_rdm1(orb, mo_occ[i][j])
+                    rdm1_orb = make_rdm1(orb, mo_occ[i][spin_mo[m]])
                     # weighted contribution to rdm1_atom
-                    rdm1_atom[i] += rdm1_orb * weights[i][m][a]
+                    rdm1_atom[i] += rdm1_orb * w
+            # file name
+            if frags is None:
+                name = f'atom_{mol.atom_symbol(a).upper():s}{a:d}_rdm1{suffix:}'
+            else:
+                name = f'frag_{a:d}_rdm1{suffix:}'
             if fmt == 'cube':
                 # write rdm1_atom as cube file
-                pyscf_tools.cubegen.density(mol, f'atom_{mol.atom_symbol(a).upper():s}{a:d}_rdm1{suffix:}.cube', \
-                                            np.sum(rdm1_atom, axis=0))
+                from pyscf.tools import cubegen
+                cubegen.density(mol, f'{name:}.cube', np.sum(rdm1_atom, axis=0))
             else:
                 # write rdm1_atom as numpy file
-                np.save(f'atom_{mol.atom_symbol(a).upper():s}{a:d}_rdm1{suffix:}.npy', np.sum(rdm1_atom, axis=0))
+                np.save(f'{name:}.npy', np.sum(rdm1_atom, axis=0))
+
+
+def e_tot(res: Dict[str, Any]) -> float:
+        """
+        this function returns the total energy of a (atom-, eda-, or orbital-wise) decomposed energy
+        """
+        if isinstance(res['el'], list):
+            return np.sum(res['struct']) + np.sum(res['el'][0]) + np.sum(res['el'][1])
+        return np.sum(res['struct']) + np.sum(res['el'])
 
 
 def res_add(res_a, res_b):
@@ -225,6 +252,7 @@ def contract(eqn, *tensors):
         interface to optimized einsum operation
         """
         if OE_AVAILABLE:
+            import opt_einsum as oe
             return oe.contract(eqn, *tensors)
         else:
             return np.einsum(eqn, *tensors, optimize=True)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+"""
+trajectory module
+"""
+
+__author__ = 'Dr. Janus Juul Eriksen, University of Bristol, UK'
+__maintainer__ = 'Dr. Janus Juul Eriksen'
+__email__ = 'janus.eriksen@bristol.ac.uk'
+__status__ = 'Development'
+
+import copy
+import tempfile
+import numpy as np
+from pyscf import gto, scf, dft, lib
+from typing import Dict, Iterable, Iterator, Union, Optional, Any
+
+from .decodense import main
+from .decomp import DecompCls
+
+
+def trajectory(mol: gto.Mole, decomp: DecompCls, \
+               frames: Iterable[Union[np.ndarray, scf.hf.SCF, dft.rks.KohnShamDFT]], \
+               mf: Optional[Union[scf.hf.SCF, dft.rks.KohnShamDFT]] = None, \
+               loc_lst: Optional[Any] = None) -> Iterator[Dict[str, Any]]:
+        """
+        this function decomposes a sequence of frames of the same molecule and yields the results of each frame
+        as it completes. frames are either converged mean-field objects or geometries (natm x 3 coordinates in bohr),
+        for which a copy of the mean-field object mf is run (starting from the density of the previous frame).
+        the localization of each frame is warm-started from the localized orbitals of the previous frame
+        """
+        # previous frame
+        mol_prev = mo_prev = rdm1_prev = None
+
+        # loop over frames
+        for frame in frames:
+
+            # mean-field calculation of given frame
+            if isinstance(frame, scf.hf.SCF):
+                mf_frame = frame
+                mol_frame = frame.mol
+            else:
+                assert mf is not None, 'a mean-field object must be supplied for frames given as geometries'
+                mol_frame = mol.set_geom_(np.asarray(frame), unit='Bohr', inplace=False)
+                mf_frame = _copy_mf(mf, mol_frame)
+                mf_frame.kernel(dm0=rdm1_prev)
+                rdm1_prev = mf_frame.make_rdm1()
+
+            # decompose frame
+            if mo_prev is None:
+                loc_guess = None
+            else:
+                loc_guess = (mol_prev, mo_prev)
+            res = main(mol_frame, decomp, mf_frame, loc_lst=loc_lst, loc_guess=loc_guess)
+
+            # localized orbitals of given frame
+            if decomp.loc != '':
+                mol_prev, mo_prev = mol_frame, decomp.mo_coeff
+
+            yield res
+
+
+def _copy_mf(mf: Union[scf.hf.SCF, dft.rks.KohnShamDFT], mol: gto.Mole) -> Union[scf.hf.SCF, dft.rks.KohnShamDFT]:
+        """
+        this function returns a copy of a mean-field object for another geometry. grids and density fitting
+        objects are copied before they are reset, such that the mean-field object passed in is left untouched
+        """
+        mf_copy = copy.copy(mf)
+        # grids and density fitting objects are rebuilt in place by reset()
+        for attr in ('grids', 'nlcgrids', 'with_df'):
+            if getattr(mf_copy, attr, None) is not None:
+                setattr(mf_copy, attr, copy.copy(getattr(mf_copy, attr)))
+        mf_copy.reset(mol)
+        if getattr(mf_copy, 'with_df', None) is not None:
+            # separate file for the 3-center integrals of the copy
+            mf_copy.with_df._cderi_to_save = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
+            mf_copy.with_df.reset(mol)
+        return mf_copy
@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*
 
+import os
+import tempfile
+import threading
 import unittest
+import h5py
 import numpy as np
-from pyscf import gto, scf, dft
+from pyscf import gto, scf, dft, lib
 
 import decodense
 
@@ -84,6 +88,150 @@ class KnownValues(unittest.TestCase):
                         else:
                             e_tot = np.sum(res['struct']) + np.sum(res['el'])
                         self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+    def test_5(self):
+        mf_e_tot = mf.e_tot
+        with tempfile.TemporaryDirectory() as tmpdir:
+            chkfile = os.path.join(tmpdir, 'decodense.chk')
+            for loc in LOC[1:2]:
+                for pop in POP[1:]:
+                    for part in PART + PART:
+                        with self.subTest(loc=loc, pop=pop, part=part):
+                            decomp = decodense.DecompCls(loc=loc, pop=pop, part=part, chkfile=chkfile)
+                            res = decodense.main(mol, decomp, mf)
+                            if part == 'orbitals':
+                                e_tot = np.sum(res['struct']) + np.sum(res['el'][0]) + np.sum(res['el'][1])
+                            else:
+                                e_tot = np.sum(res['struct']) + np.sum(res['el'])
+                            self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+    def test_6(self):
+        # at least two cores (openmp threads) such that two workers are used irrespective of the host
+        n_threads = lib.num_threads()
+        try:
+            lib.num_threads(max(2, n_threads))
+            for loc in LOC[1:]:
+                for parallel in ('procs', 'threads'):
+                    with self.subTest(loc=loc, parallel=parallel):
+                        decomp = decodense.DecompCls(loc=loc, part='atoms')
+                        res = decodense.main(mol, decomp, mf)
+                        decomp_par = decodense.DecompCls(loc=loc, part='atoms', parallel=parallel, n_workers=2)
+                        res_par = decodense.main(mol, decomp_par, mf)
+                        np.testing.assert_array_almost_equal(res['el'], res_par['el'], TOL)
+                        self.assertEqual([stats['n_iter'] for stats in decomp.loc_stats], \
+                                         [stats['n_iter'] for stats in decomp_par.loc_stats])
+                        self.assertEqual([0, 1], [stats['spin'] for stats in decomp_par.loc_stats])
+                        # spins are localized by pool workers (not by the calling thread)
+                        self.assertEqual({(os.getpid(), threading.current_thread().name)}, \
+                                         {(stats['pid'], stats['thread']) for stats in decomp.loc_stats})
+                        for stats in decomp_par.loc_stats:
+                            if parallel == 'procs':
+                                self.assertNotEqual(os.getpid(), stats['pid'])
+                            else:
+                                self.assertEqual(os.getpid(), stats['pid'])
+                                self.assertNotEqual(threading.current_thread().name, stats['thread'])
+        finally:
+            lib.num_threads(n_threads)
+        with self.subTest(split=True):
+            # workers are capped by the number of tasks before the cores are split into threads
+            n_threads = lib.num_threads()
+            try:
+                lib.num_threads(4)
+                self.assertEqual((2, 2), decodense.parallel.split('threads', None, 2))
+                self.assertEqual((4, 1), decodense.parallel.split('procs', None, 8))
+                self.assertEqual((1, 4), decodense.parallel.split('procs', 2, 1))
+                self.assertEqual((1, 4), decodense.parallel.split('', 2, 2))
+            finally:
+                lib.num_threads(n_threads)
+    def test_7(self):
+        mf_e_tot = mf.e_tot
+        for loc in LOC[1:]:
+            for pop in POP:
+                with self.subTest(loc=loc, pop=pop):
+                    res = decodense.main(mol, decodense.DecompCls(loc=loc, pop=pop, part='atoms'), mf)
+                    decomp = decodense.DecompCls(loc=loc, pop=pop, part='atoms', weight_thres=1.e-12)
+                    res_sparse = decodense.main(mol, decomp, mf)
+                    np.testing.assert_array_almost_equal(res['el'], res_sparse['el'], TOL)
+                    decomp = decodense.DecompCls(loc=loc, pop=pop, part='atoms', weight_thres=1.e-2)
+                    res_sparse = decodense.main(mol, decomp, mf)
+                    self.assertAlmostEqual(mf_e_tot, np.sum(res_sparse['struct']) + np.sum(res_sparse['el']), TOL)
+                    self.assertAlmostEqual(np.sum(res['charge_atom']), np.sum(res_sparse['charge_atom']), TOL)
+                    self.assertLess(0., decomp.weight_discarded)
+    def test_8(self):
+        frags = [[0], [1, 2]]
+        for pop in POP:
+            for part in PART[1:]:
+                with self.subTest(pop=pop, part=part):
+                    res = decodense.main(mol, decodense.DecompCls(pop=pop, part=part), mf)
+                    res_frags = decodense.main(mol, decodense.DecompCls(pop=pop, part=(part, frags)), mf)
+                    for key in ('el', 'struct', 'charge_atom'):
+                        np.testing.assert_array_almost_equal(np.array([np.sum(res[key][frag]) for frag in frags]), \
+                                                             res_frags[key], TOL)
+        res_frags = decodense.main(mol, decodense.DecompCls(part=frags), mf)
+        self.assertEqual(len(frags), res_frags['el'].size)
+    def test_9(self):
+        mf_e_tot = mf.e_tot
+        for part in PART:
+            with self.subTest(part=part):
+                decomp = decodense.DecompCls(loc='pm', part=part, prop=['energy', 'dipole'])
+                res = decodense.main(mol, decomp, mf)
+                res_arr = decodense.ResultsArray.from_dict(res)
+                self.assertEqual(list(res_arr.to_dict()), res_arr.keys())
+                self.assertNotIn('timings', res_arr)
+                with self.assertRaises(KeyError):
+                    res_arr['timings']
+                for prop in ('energy', 'dipole'):
+                    for key, val in res[prop].items():
+                        if isinstance(val, (list, tuple)) or (isinstance(val, np.ndarray) and val.dtype == object):
+                            for spin in range(2):
+                                np.testing.assert_array_equal(val[spin], res_arr[prop][key][spin])
+                        else:
+                            np.testing.assert_array_equal(val, res_arr[prop][key])
+                self.assertAlmostEqual(mf_e_tot, res_arr.total('energy'), TOL)
+                res_kcal = res_arr.to_unit(energy='kcal_mol')
+                self.assertAlmostEqual(mf_e_tot * decodense.AU_TO_KCAL_MOL, res_kcal.total('energy'), TOL - 3)
+                np.testing.assert_array_almost_equal(res_arr.total('dipole'), res_kcal.total('dipole'), TOL)
+                res_diff = (res_arr + res_arr) - res_arr
+                self.assertAlmostEqual(res_arr.total('energy'), res_diff.total('energy'), TOL)
+                top = res_arr.top(3, 'energy/el')
+                table = res_arr.orbitals if part == 'orbitals' else res_arr.atoms
+                self.assertAlmostEqual(np.max(np.abs(table['energy/el'])), abs(top['energy/el'][0]), TOL)
+                self.assertTrue(np.all(np.diff(np.abs(top['energy/el'])) <= 0.))
+                self.assertEqual(table.size + 3, res_arr.render(chunk_rows=2).count('\n'))
+    def test_10(self):
+        # alpha homo -> lumo excited state
+        mo_occ = np.asarray(mf.mo_occ).copy()
+        mo_occ[0][mol.nelec[0] - 1], mo_occ[0][mol.nelec[0]] = 0., 1.
+        mf_ex = dft.UKS(mol).density_fit(auxbasis='weigend', only_dfj=True)
+        mf_ex.xc = 'pbe0'
+        mf_ex.grids = mf.grids
+        mf_ex.conv_tol = 1.e-10
+        mf_ex = scf.addons.mom_occ(mf_ex, mf.mo_coeff, mo_occ)
+        mf_ex.kernel(mf_ex.make_rdm1(mf.mo_coeff, mo_occ))
+        mf_e_diff = mf_ex.e_tot - mf.e_tot
+        for part in PART:
+            with self.subTest(part=part):
+                decomp = decodense.DecompCls(loc='pm', part=part)
+                res_diff = decodense.main_diff(mol, decomp, [mf, mf_ex])[0]
+                res_gs = decodense.main(mol, decodense.DecompCls(loc='pm', part=part), mf)
+                res_ex = decodense.main(mol, decodense.DecompCls(loc='pm', part=part), mf_ex)
+                if part == 'orbitals':
+                    e_diff = np.sum(res_diff['struct']) + np.sum(res_diff['el'][0]) + np.sum(res_diff['el'][1])
+                    for i in range(2):
+                        np.testing.assert_array_almost_equal(res_ex['xc'][i] - res_gs['xc'][i], res_diff['xc'][i], TOL)
+                else:
+                    e_diff = np.sum(res_diff['struct']) + np.sum(res_diff['el'])
+                    np.testing.assert_array_almost_equal(res_ex['xc'] - res_gs['xc'], res_diff['xc'], TOL)
+                self.assertAlmostEqual(mf_e_diff, e_diff, TOL)
+                # xc contributions of both states from a single pass over the shared grid
+                self.assertNotIn('timings', res_diff)
+                self.assertEqual(1, decomp.timings['xc']['calls'])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            chkfile = os.path.join(tmpdir, 'decodense.chk')
+            res = [decodense.main_diff(mol, decodense.DecompCls(loc='pm', part='atoms', chkfile=chkfile), \
+                                       [mf, mf_ex])[0] for _ in range(2)]
+            np.testing.assert_array_equal(res[0]['el'], res[1]['el'])
+            # per-state checkpoint stages
+            with h5py.File(chkfile, 'r') as f:
+                self.assertTrue({'orbs', 'orbs_1', 'weights', 'weights_1', 'jk', 'jk_1'} <= set(f.keys()))
 
 if __name__ == '__main__':
     print('test: ch2_pbe0_energy_gs')
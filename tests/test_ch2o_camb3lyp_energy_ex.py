@@ -114,6 +114,24 @@ class KnownValues(unittest.TestCase):
                         else:
                             e_tot = np.sum(res_ex['struct']) + np.sum(res_ex['el'])
                         self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+    def test_5(self):
+        mf_e_diff = mf_ex.e_tot - mf_gs.e_tot
+        for loc in LOC[:3]:
+            for pop in POP:
+                for part in PART:
+                    with self.subTest(loc=loc, pop=pop, part=part):
+                        decomp = decodense.DecompCls(loc=loc, pop=pop, part=part)
+                        res_diff = decodense.main_diff(mol, decomp, [mf_gs, mf_ex])[0]
+                        res_gs = decodense.main(mol, decodense.DecompCls(loc=loc, pop=pop, part=part), mf_gs)
+                        res_ex = decodense.main(mol, decodense.DecompCls(loc=loc, pop=pop, part=part), mf_ex)
+                        if part == 'orbitals':
+                            e_diff = np.sum(res_diff['struct']) + np.sum(res_diff['el'][0]) + np.sum(res_diff['el'][1])
+                            for i in range(2):
+                                np.testing.assert_array_almost_equal(res_ex['xc'][i] - res_gs['xc'][i], res_diff['xc'][i], TOL)
+                        else:
+                            e_diff = np.sum(res_diff['struct']) + np.sum(res_diff['el'])
+                            np.testing.assert_array_almost_equal(res_ex['el'] - res_gs['el'], res_diff['el'], TOL)
+                        self.assertAlmostEqual(mf_e_diff, e_diff, TOL)
 
 if __name__ == '__main__':
     print('test: ch2o_camb3lyp_energy_ex')
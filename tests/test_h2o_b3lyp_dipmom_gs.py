@@ -3,7 +3,7 @@
 
 import unittest
 import numpy as np
-from pyscf import gto, scf, dft
+from pyscf import gto, scf, dft, lo
 
 import decodense
 
@@ -48,6 +48,44 @@ class KnownValues(unittest.TestCase):
                                           + np.fromiter(map(np.sum, res['struct'].T), dtype=np.float64, count=3)
                         np.testing.assert_array_almost_equal(mf_dipmom_tot, dipmom_tot, TOL)
                         self.assertAlmostEqual(np.linalg.norm(mf_dipmom_tot), np.linalg.norm(dipmom_tot), TOL)
+    def test_2(self):
+        decodense.cache_clear()
+        decomp = decodense.DecompCls(part='atoms', prop='dipole')
+        res = decodense.main(mol, decomp, mf)
+        misses = decodense.cache_info()['misses']
+        res_cached = decodense.main(mol, decomp, mf)
+        self.assertEqual(misses, decodense.cache_info()['misses'])
+        self.assertLess(0, decodense.cache_info()['hits'])
+        np.testing.assert_array_equal(res['el'], res_cached['el'])
+        decodense.cache_max_memory(0.)
+        self.assertEqual(0, decodense.cache_info()['entries'])
+        decodense.main(mol, decodense.DecompCls(part='atoms', prop='dipole', gauge_origin=np.ones(3)), mf)
+        self.assertEqual(0, decodense.cache_info()['entries'])
+        decodense.cache_max_memory(decodense.integrals.MAX_MEMORY)
+    def test_3(self):
+        mf_e_tot = mf.e_tot
+        mf_dipmom_tot = mf.dip_moment(unit='au', verbose=0)
+        for pop in POP:
+            for part in PART:
+                with self.subTest(pop=pop, part=part):
+                    decomp = decodense.DecompCls(pop=pop, part=part, prop=['energy', 'dipole'])
+                    res = decodense.main(mol, decomp, mf)
+                    if part == 'orbitals':
+                        e_tot = np.sum(res['energy']['struct']) + np.sum(res['energy']['el'][0]) + np.sum(res['energy']['el'][1])
+                        dipmom_tot = np.sum(res['dipole']['el'][0], axis=0) + np.sum(res['dipole']['el'][1], axis=0) \
+                                      + np.sum(res['dipole']['struct'], axis=0)
+                    else:
+                        e_tot = np.sum(res['energy']['struct']) + np.sum(res['energy']['el'])
+                        dipmom_tot = np.sum(res['dipole']['el'], axis=0) + np.sum(res['dipole']['struct'], axis=0)
+                    self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+                    np.testing.assert_array_almost_equal(mf_dipmom_tot, dipmom_tot, TOL)
+    def test_4(self):
+        orbocc = mf.mo_coeff[:, mf.mo_occ > 0.]
+        iao_ref = lo.vec_lowdin(lo.iao.iao(mol, orbocc), mol.intor_symmetric('int1e_ovlp'))
+        iao_ctx = decodense.orbitals.IAOContext(mol)
+        iao = iao_ctx.get(orbocc, 0, np.where(mf.mo_occ > 0.)[0])
+        np.testing.assert_array_almost_equal(iao_ref, iao, TOL)
+        self.assertIs(iao, iao_ctx.get(orbocc[:, ::-1], 0, np.where(mf.mo_occ > 0.)[0]))
 
 if __name__ == '__main__':
     print('test: h2o_b3lyp_dipmom_gs')
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from pyscf import gto, scf, dft
+
+import decodense
+
+# decimal tolerance
+TOL = 9
+
+# settings
+LOC = ('fb', 'pm', 'ibo-2')
+PART = ('orbitals', 'eda', 'atoms')
+
+# init molecule
+mol = gto.M(verbose = 0, output = None,
+basis = 'pcseg1', symmetry = False,
+atom = 'geom/h2o.xyz')
+
+# frames (symmetric stretch of the OH bonds)
+frames = [mol.atom_coords() * np.array([[1.], [scale], [scale]]) for scale in (1., 1.02, 1.04)]
+
+# mf template
+mf = scf.RHF(mol)
+mf.conv_tol = 1.e-10
+
+def tearDownModule():
+    global mol, mf
+    mol.stdout.close()
+    del mol, mf
+
+class KnownValues(unittest.TestCase):
+    def test(self):
+        for loc in LOC:
+            for part in PART:
+                with self.subTest(loc=loc, part=part):
+                    decomp = decodense.DecompCls(loc=loc, part=part)
+                    for coords, res in zip(frames, decodense.trajectory(mol, decomp, frames, mf=mf)):
+                        mf_frame = scf.RHF(mol.set_geom_(coords, unit='Bohr', inplace=False))
+                        mf_frame.conv_tol = 1.e-10
+                        mf_e_tot = mf_frame.kernel()
+                        if part == 'orbitals':
+                            e_tot = np.sum(res['struct']) + np.sum(res['el'][0]) + np.sum(res['el'][1])
+                        else:
+                            e_tot = np.sum(res['struct']) + np.sum(res['el'])
+                        self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+    def test_2(self):
+        mfs = []
+        for coords in frames:
+            mfs.append(scf.RHF(mol.set_geom_(coords, unit='Bohr', inplace=False)))
+            mfs[-1].conv_tol = 1.e-10
+            mfs[-1].kernel()
+        for loc in LOC:
+            with self.subTest(loc=loc):
+                decomp = decodense.DecompCls(loc=loc, part='atoms')
+                res = list(decodense.trajectory(mol, decomp, mfs))
+                res_ref = decodense.main(mfs[0].mol, decodense.DecompCls(loc=loc, part='atoms'), mfs[0])
+                np.testing.assert_array_almost_equal(res[0]['el'], res_ref['el'], TOL)
+                for mf_frame, res_frame in zip(mfs, res):
+                    self.assertAlmostEqual(mf_frame.e_tot, np.sum(res_frame['struct']) + np.sum(res_frame['el']), TOL)
+    def test_3(self):
+        fmts = ('.npz', '.h5', '.parquet') if decodense.export.PYARROW_AVAILABLE else ('.npz', '.h5')
+        decomp = decodense.DecompCls(loc='pm', part='orbitals', prop=['energy', 'dipole'])
+        res = list(decodense.trajectory(mol, decomp, frames, mf=mf))
+        with tempfile.TemporaryDirectory() as tmp:
+            for fmt in fmts:
+                for compress in (True, False):
+                    with self.subTest(fmt=fmt, compress=compress):
+                        fname = os.path.join(tmp, 'res' + fmt)
+                        # stream first frames, append last frame
+                        with decodense.ResultsWriter(fname, compress=compress, buffer_rows=10) as writer:
+                            for frame, res_frame in enumerate(res[:-1]):
+                                writer.append(res_frame, frame=frame)
+                        with decodense.ResultsWriter(fname, mode='a', compress=compress) as writer:
+                            writer.append(res[-1], frame=len(res) - 1)
+                        records = decodense.read_results(fname, 'records')
+                        atoms = decodense.read_results(fname, 'atoms')
+                        orbs = decodense.read_results(fname, 'orbitals', mmap=True)
+                        np.testing.assert_array_equal(records['frame'], np.arange(len(res)))
+                        for frame, res_frame in enumerate(res):
+                            rows = orbs['record'] == frame
+                            for spin in (0, 1):
+                                np.testing.assert_array_equal(orbs['energy/el'][rows][orbs['spin'][rows] == spin], \
+                                                              res_frame['energy']['el'][spin])
+                                np.testing.assert_array_equal(orbs['dipole/el'][rows][orbs['spin'][rows] == spin], \
+                                                              res_frame['dipole']['el'][spin])
+                            np.testing.assert_array_equal(orbs['orbsym'][rows], res_frame['energy']['orbsym'].ravel())
+                            np.testing.assert_array_equal(atoms['dipole/struct'][atoms['record'] == frame], \
+                                                          res_frame['dipole']['struct'])
+    def test_4(self):
+        mf_dft = dft.RKS(mol).density_fit()
+        mf_dft.xc = 'pbe'
+        mf_dft.grids.level = 1
+        mf_dft.conv_tol = 1.e-10
+        mf_dft.kernel()
+        grids_coords, mf_e_tot = mf_dft.grids.coords.copy(), mf_dft.e_tot
+        decomp = decodense.DecompCls(loc='pm', part='atoms')
+        res = list(decodense.trajectory(mol, decomp, frames[1:], mf=mf_dft))
+        self.assertEqual(len(res), len(frames[1:]))
+        # mean-field object passed in is untouched
+        for obj in (mf_dft, mf_dft.grids, mf_dft.nlcgrids, mf_dft.with_df):
+            self.assertIs(obj.mol, mol)
+        np.testing.assert_array_equal(mf_dft.grids.coords, grids_coords)
+        res = decodense.main(mol, decomp, mf_dft)
+        self.assertAlmostEqual(mf_e_tot, np.sum(res['struct']) + np.sum(res['el']), TOL)
+    def test_5(self):
+        for coords in frames:
+            mol_frame = mol.set_geom_(coords, unit='Bohr', inplace=False)
+            pmol = decodense.orbitals.IAOContext(mol_frame).pmol
+            np.testing.assert_array_almost_equal(mol_frame.atom_coords(), pmol.atom_coords(), TOL)
+            np.testing.assert_array_almost_equal(mol_frame.atom_coords(), np.array([atom[1] for atom in pmol._atom]), TOL)
+
+if __name__ == '__main__':
+    print('test: h2o_hf_energy_traj')
+    unittest.main()
@@ -3,6 +3,7 @@
 
 import unittest
 import numpy as np
+from multiprocessing.pool import ThreadPool
 from pyscf import gto, scf, dft
 
 import decodense
@@ -33,6 +34,10 @@ def tearDownModule():
     mol.stdout.close()
     del mol, mf
 
+def _stage(name):
+    with decodense.timings.timing(name):
+        pass
+
 class KnownValues(unittest.TestCase):
     def test(self):
         mf_e_tot = mf.e_tot
@@ -89,6 +94,78 @@ class KnownValues(unittest.TestCase):
                         else:
                             e_tot = np.sum(res['struct']) + np.sum(res['el'])
                         self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+    def test_5(self):
+        mf_e_tot = mf.e_tot
+        for loc in LOC[:1]:
+            for pop in POP[:1]:
+                for part in PART:
+                    with self.subTest(loc=loc, pop=pop, part=part):
+                        decomp = decodense.DecompCls(loc=loc, pop=pop, part=part, grid_blksize=1000)
+                        res = decodense.main(mol, decomp, mf)
+                        if part == 'orbitals':
+                            e_tot = np.sum(res['struct']) + np.sum(res['el'][0]) + np.sum(res['el'][1])
+                        else:
+                            e_tot = np.sum(res['struct']) + np.sum(res['el'])
+                        self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+    def test_6(self):
+        mf_e_tot = mf.e_tot
+        for part in PART:
+            with self.subTest(part=part):
+                decomp = decodense.DecompCls(part=part, auxbasis='weigend')
+                res = decodense.main(mol, decomp, mf)
+                if part == 'orbitals':
+                    e_tot = np.sum(res['struct']) + np.sum(res['el'][0]) + np.sum(res['el'][1])
+                else:
+                    e_tot = np.sum(res['struct']) + np.sum(res['el'])
+                self.assertAlmostEqual(e_tot - mf_e_tot, decomp.e_tot_dev, TOL)
+                self.assertAlmostEqual(mf_e_tot, e_tot, 4)
+    def test_7(self):
+        for part in PART:
+            with self.subTest(part=part):
+                decomp = decodense.DecompCls(loc='pm', part=part)
+                res = decodense.main(mol, decomp, mf)
+                self.assertNotIn('timings', res)
+                # atom-wise results of main() can be subtracted (cf. delta-scf)
+                if part != 'orbitals':
+                    res_zero = decodense.res_sub(res, decodense.main(mol, decodense.DecompCls(loc='pm', part=part), mf))
+                    for key in ('el', 'struct'):
+                        np.testing.assert_array_almost_equal(np.zeros_like(res[key]), res_zero[key], TOL)
+                stages = ['total', 'sanity_check', 'memory_plan', 'orbitals', 'localization', 'integrals', 'jk', 'nlc', 'xc', 'partition']
+                if part != 'orbitals':
+                    stages.append('weights')
+                self.assertEqual(set(stages + ['grid', 'eval_xc']), set(decomp.timings))
+                for stage in stages:
+                    self.assertEqual(1, decomp.timings[stage]['calls'])
+                    self.assertLessEqual(decomp.timings[stage]['wall'], decomp.timings['total']['wall'])
+                for entry in decomp.timings.values():
+                    self.assertLessEqual(0., entry['peak_mem'])
+                    self.assertLessEqual(entry['peak_mem'], decomp.timings['total']['peak_mem'])
+        with self.subTest(workers='threads'):
+            with decodense.timings.Timings() as timings:
+                with ThreadPool(processes=1) as pool:
+                    pool.apply(_stage, ('worker',))
+                _stage('parent')
+            self.assertEqual(['parent'], list(timings.stages))
+    def test_8(self):
+        mf_e_tot = mf.e_tot
+        for part in PART:
+            with self.subTest(part=part):
+                decomp = decodense.DecompCls(part=part, max_memory=20.)
+                res = decodense.main(mol, decomp, mf)
+                if part == 'orbitals':
+                    e_tot = np.sum(res['struct']) + np.sum(res['el'][0]) + np.sum(res['el'][1])
+                else:
+                    e_tot = np.sum(res['struct']) + np.sum(res['el'])
+                self.assertAlmostEqual(mf_e_tot, e_tot, TOL)
+                self.assertLessEqual(decomp.plan['peak'], decomp.max_memory)
+                self.assertEqual(0, decomp.plan['grid_blksize'] % dft.numint.BLKSIZE)
+                self.assertTrue({'base', 'jk', 'nuc', 'nlc', 'xc', 'partition'} <= set(decomp.plan['stages']))
+                # in-core eri tensor
+                npair = mol.nao_nr() * (mol.nao_nr() + 1) // 2
+                self.assertLessEqual(npair * (npair + 1) // 2 * 8 / 1.e6, decomp.plan['stages']['jk'])
+        with self.subTest(max_memory=1.):
+            with self.assertRaises(MemoryError):
+                decodense.main(mol, decodense.DecompCls(max_memory=1.), mf)
 
 if __name__ == '__main__':
     print('test: h2o_wb97m_v_energy_gs')
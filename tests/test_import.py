@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+
+import os
+import sys
+import unittest
+import subprocess
+
+import decodense
+
+# modules that must not be loaded by `import decodense`
+LAZY = ('pandas', 'pyscf.solvent', 'pyscf.tools', 'opt_einsum', 'pyarrow')
+
+def fresh_import(code):
+    env = {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.dirname(os.path.abspath(decodense.__file__)))}
+    return subprocess.run([sys.executable, '-c', 'import sys, decodense; ' + code], env=env, \
+                          stdout=subprocess.PIPE, check=True).stdout.decode().split()
+
+class KnownValues(unittest.TestCase):
+    def test(self):
+        loaded = fresh_import('print(*(mod in sys.modules for mod in {:}))'.format(LAZY))
+        for mod, mod_loaded in zip(LAZY, loaded):
+            with self.subTest(mod=mod):
+                self.assertEqual('False', mod_loaded)
+    def test_2(self):
+        decodense.tools.git_version.cache_clear()
+        version = decodense.tools.git_version()
+        self.assertIs(version, decodense.tools.git_version())
+        self.assertEqual(1, decodense.tools.git_version.cache_info().misses)
+
+if __name__ == '__main__':
+    print('test: import')
+    unittest.main()